@@ -1,4 +1,6 @@
+import logging
 import os
+import time
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -9,6 +11,12 @@ from openpyxl import load_workbook
 from config import config
 from database import db, DatabaseManager  
 from auth import AuthManager, login_required, role_required
+from pagination import EmployeePageRequest, PageRequestError
+from http_cache import conditional_get
+from sql_timing import init_sql_timing
+from metrics import init_metrics, metrics_response, record_import
+from logs import init_logging
+import ratelimit_storage  # noqa: F401 - registers sqlite:// for RATELIMIT_STORAGE_URI
 
 # Create Flask app
 app = Flask(__name__)
@@ -25,9 +33,20 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     
-print(f"DEBUG: Flask secret key configured: {bool(app.config.get('SECRET_KEY'))}")
+# Structured logging through a background queue
+init_logging()
+app_log = logging.getLogger('raffle.app')
+employees_log = logging.getLogger('raffle.employees')
+import_log = logging.getLogger('raffle.import')
+app_log.debug('Flask secret key configured: %s', bool(app.config.get('SECRET_KEY')))
 
-# Initialize rate limiter
+# Per-request SQL timing, reported in the Server-Timing header
+init_sql_timing(app)
+
+# Prometheus request metrics, served at /metrics
+init_metrics(app)
+
+# Initialize rate limiter; storage and strategy come from the RATELIMIT_* config
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["100 per hour"]
@@ -42,9 +61,9 @@ os.makedirs('uploads', exist_ok=True)
 try:
     db_manager = DatabaseManager()
     db_manager.init_database()
-    print("Database initialized successfully")
+    app_log.info('Database initialized successfully')
 except Exception as e:
-    print(f"Database initialization error: {e}")
+    app_log.error('Database initialization error: %s', e)
 
 @app.route('/')
 def index():
@@ -79,11 +98,17 @@ def login():
 @app.route('/dashboard')
 def dashboard():
     from flask import session
-    print(f"DEBUG: Dashboard route called, session: {dict(session)}")
+    app_log.debug('Dashboard route called, logged in: %s', bool(session.get('logged_in')))
     if session.get('logged_in'):
         return render_template('dashboard.html')
     return redirect(url_for('login'))
 
+# Prometheus scrape target, summed across gunicorn workers
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    return metrics_response()
+
 @app.route('/test-session')
 def test_session():
     from flask import session
@@ -92,39 +117,37 @@ def test_session():
 
 @app.route('/api/employees', methods=['GET'])
 @login_required
+@conditional_get
 def get_employees():
     try:
-        with db.get_connection() as conn:
-            # Count total employees first
-            count_cursor = conn.execute('SELECT COUNT(*) as total FROM employees WHERE is_active = 1')
-            total = count_cursor.fetchone()['total']
-            print(f"DEBUG: Found {total} active employees")
-            
-            cursor = conn.execute('''
-                SELECT id, name, email, phone, department, position, 
-                       hire_date, photo_path, total_entries, is_active,
-                       created_at, updated_at
-                FROM employees WHERE is_active = 1
-                ORDER BY name
-            ''')
+        page = EmployeePageRequest(request.args)
+    except PageRequestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        with db.read_connection() as conn:
+            # total is the whole active roster, as clients showing a roster count expect,
+            # whatever page this is; count is the number of employees on this page
+            total = conn.execute('SELECT COUNT(*) as total FROM employees WHERE is_active = 1').fetchone()['total']
+            employees_log.debug('Found %d active employees', total)
             
-            employees = []
-            for row in cursor.fetchall():
-                employee = dict(row)
-                employees.append(employee)
-                print(f"DEBUG: Added employee: {employee['name']}")
+            rows, next_cursor = page.fetch(conn)
+            employees = page.project(rows)
             
             response_data = {
                 'success': True,
                 'employees': employees,
-                'total': len(employees)
+                'total': total,
+                'count': len(employees),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
-            print(f"DEBUG: Returning {len(employees)} employees")
+            employees_log.debug('Returning %d employees', len(employees))
             
             return jsonify(response_data)
             
     except Exception as e:
-        print(f"DEBUG: Error in get_employees: {e}")
+        employees_log.exception('Error in get_employees')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/employee', methods=['POST'])
@@ -134,35 +157,37 @@ def add_employee():
     try:
         data = request.get_json()
         name = data.get('name', '').strip()
-        print(f"DEBUG: Adding employee: '{name}'")
+        employees_log.debug("Adding employee: '%s'", name)
         
         if not name:
             return jsonify({'success': False, 'error': 'Name is required'}), 400
         
-        with db.get_connection() as conn:
+        def insert_employee(conn):
             cursor = conn.execute(
                 'SELECT id FROM employees WHERE name = ? AND is_active = 1', 
                 (name,)
             )
             if cursor.fetchone():
-                print(f"DEBUG: Employee '{name}' already exists")
-                return jsonify({'success': False, 'error': 'Employee already exists'}), 400
+                return False
             
             conn.execute('''
                 INSERT INTO employees (name, total_entries, is_active, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?)
             ''', (name, 0, 1, datetime.now(), datetime.now()))
-            
-            conn.commit()
-            print(f"DEBUG: Successfully added employee '{name}'")
-            
-            return jsonify({
-                'success': True,
-                'message': f'Employee "{name}" added successfully'
-            })
+            return True
+        
+        if not db.write(insert_employee):
+            employees_log.debug("Employee '%s' already exists", name)
+            return jsonify({'success': False, 'error': 'Employee already exists'}), 400
+        employees_log.debug("Successfully added employee '%s'", name)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Employee "{name}" added successfully'
+        })
             
     except Exception as e:
-        print(f"DEBUG: Error adding employee: {e}")
+        employees_log.exception('Error adding employee')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/employee/<int:employee_id>/add_entry', methods=['POST'])
@@ -180,32 +205,37 @@ def add_entry(employee_id):
         if entries_awarded <= 0 or entries_awarded > 10:
             return jsonify({'success': False, 'error': 'Entries must be between 1 and 10'}), 400
         
-        with db.get_connection() as conn:
+        awarded_by = request.current_user['user_id']
+        
+        def award_entries(conn):
             # Check if employee exists
             cursor = conn.execute('SELECT id, name, total_entries FROM employees WHERE id = ? AND is_active = 1', (employee_id,))
             employee = cursor.fetchone()
             
             if not employee:
-                return jsonify({'success': False, 'error': 'Employee not found'}), 404
+                return None
             
             # Add activity
             conn.execute('''
                 INSERT INTO activities (employee_id, activity_name, activity_category, 
                                       entries_awarded, awarded_by)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (employee_id, activity_name, 'manual', entries_awarded, request.current_user['id']))
+            ''', (employee_id, activity_name, 'manual', entries_awarded, awarded_by))
             
             # Update employee total entries
             new_total = employee['total_entries'] + entries_awarded
             conn.execute('UPDATE employees SET total_entries = ?, updated_at = ? WHERE id = ?', 
                         (new_total, datetime.now(), employee_id))
-            
-            conn.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': f'Added {entries_awarded} entries for {employee["name"]}'
-            })
+            return employee['name']
+        
+        employee_name = db.write(award_entries)
+        if employee_name is None:
+            return jsonify({'success': False, 'error': 'Employee not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'message': f'Added {entries_awarded} entries for {employee_name}'
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -215,12 +245,12 @@ def add_entry(employee_id):
 @role_required('manager')
 def reset_points(employee_id):
     try:
-        with db.get_connection() as conn:
+        def clear_points(conn):
             cursor = conn.execute('SELECT name FROM employees WHERE id = ? AND is_active = 1', (employee_id,))
             employee = cursor.fetchone()
             
             if not employee:
-                return jsonify({'success': False, 'error': 'Employee not found'}), 404
+                return None
             
             # Reset points
             conn.execute('UPDATE employees SET total_entries = 0, updated_at = ? WHERE id = ?', 
@@ -228,13 +258,16 @@ def reset_points(employee_id):
             
             # Remove all activities for this employee
             conn.execute('DELETE FROM activities WHERE employee_id = ?', (employee_id,))
-            
-            conn.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': f'Reset points for {employee["name"]}'
-            })
+            return employee['name']
+        
+        employee_name = db.write(clear_points)
+        if employee_name is None:
+            return jsonify({'success': False, 'error': 'Employee not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'message': f'Reset points for {employee_name}'
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -244,14 +277,14 @@ def reset_points(employee_id):
 @role_required('manager')
 def import_excel():
     try:
-        print("DEBUG: Excel import started")
+        import_log.debug('Excel import started')
         
         if 'file' not in request.files:
-            print("DEBUG: No file in request")
+            import_log.info('Import rejected: no file in request')
             return jsonify({'success': False, 'error': 'No file provided'}), 400
         
         file = request.files['file']
-        print(f"DEBUG: File received: {file.filename}")
+        import_log.debug('File received: %s', file.filename)
         
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No file selected'}), 400
@@ -260,64 +293,66 @@ def import_excel():
             return jsonify({'success': False, 'error': 'Invalid file type. Please upload Excel files only.'}), 400
         
         # Process Excel file
-        print("DEBUG: Loading workbook...")
+        started = time.perf_counter()
         workbook = load_workbook(file)
         sheet = workbook.active
-        print(f"DEBUG: Sheet loaded, max row: {sheet.max_row}")
+        import_log.debug('Sheet loaded, max row: %d', sheet.max_row)
         
-        employees_added = 0
-        errors = []
         names_found = []
+        pending = []
         
-        with db.get_connection() as conn:
-            for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                if not row or not any(row):
-                    continue
+        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+            if not row or not any(row):
+                continue
                 
-                # Try to find and combine first and last names
-                name = None
-                first_name = None
-                last_name = None
+            # Try to find and combine first and last names
+            name = None
+            first_name = None
+            last_name = None
                 
-                # Check for separate first and last name columns
-                for col_idx, cell in enumerate(row[:10]):  # Check first 10 columns
-                    if cell and isinstance(cell, str) and len(cell.strip()) > 1:
-                        cell_value = cell.strip()
+            # Check for separate first and last name columns
+            for col_idx, cell in enumerate(row[:10]):  # Check first 10 columns
+                if cell and isinstance(cell, str) and len(cell.strip()) > 1:
+                    cell_value = cell.strip()
                         
-                        # Look for first name column
-                        if col_idx == 0 or 'first' in str(sheet.cell(1, col_idx + 1).value or '').lower():
-                            first_name = cell_value
-                            print(f"DEBUG: Found first name '{first_name}' in column {col_idx}")
+                    # Look for first name column
+                    if col_idx == 0 or 'first' in str(sheet.cell(1, col_idx + 1).value or '').lower():
+                        first_name = cell_value
+                        import_log.debug("Row %d: first name '%s' in column %d", row_num, first_name, col_idx)
                         
-                        # Look for last name column
-                        elif col_idx == 1 or 'last' in str(sheet.cell(1, col_idx + 1).value or '').lower():
-                            last_name = cell_value
-                            print(f"DEBUG: Found last name '{last_name}' in column {col_idx}")
+                    # Look for last name column
+                    elif col_idx == 1 or 'last' in str(sheet.cell(1, col_idx + 1).value or '').lower():
+                        last_name = cell_value
+                        import_log.debug("Row %d: last name '%s' in column %d", row_num, last_name, col_idx)
                         
-                        # If it looks like a full name (has space)
-                        elif ' ' in cell_value and len(cell_value.split()) >= 2:
-                            name = cell_value
-                            print(f"DEBUG: Found full name '{name}' in column {col_idx}")
-                            break
+                    # If it looks like a full name (has space)
+                    elif ' ' in cell_value and len(cell_value.split()) >= 2:
+                        name = cell_value
+                        import_log.debug("Row %d: full name '%s' in column %d", row_num, name, col_idx)
+                        break
                         
-                        # Single name fallback
-                        elif not first_name and len(cell_value) > 2:
-                            first_name = cell_value
-                            print(f"DEBUG: Using '{first_name}' as name from column {col_idx}")
+                    # Single name fallback
+                    elif not first_name and len(cell_value) > 2:
+                        first_name = cell_value
+                        import_log.debug("Row %d: using '%s' as name from column %d", row_num, first_name, col_idx)
                 
-                # Combine first and last names if found separately
-                if first_name and last_name:
-                    name = f"{first_name} {last_name}"
-                    print(f"DEBUG: Combined name: '{name}'")
-                elif first_name:
-                    name = first_name
-                    print(f"DEBUG: Using first name only: '{name}'")
+            # Combine first and last names if found separately
+            if first_name and last_name:
+                name = f"{first_name} {last_name}"
+                import_log.debug("Row %d: combined name '%s'", row_num, name)
+            elif first_name:
+                name = first_name
+                import_log.debug("Row %d: using first name only '%s'", row_num, name)
                 
-                if not name:
-                    continue
+            if not name:
+                continue
                     
-                names_found.append(name)
-                
+            names_found.append(name)
+            pending.append((row_num, name))
+        
+        def insert_employees(conn):
+            added, row_errors = 0, []
+            for row_num, name in pending:
                 try:
                     # Check if employee exists
                     cursor = conn.execute('SELECT id FROM employees WHERE name = ? AND is_active = 1', (name,))
@@ -327,18 +362,22 @@ def import_excel():
                             INSERT INTO employees (name, total_entries, is_active, created_at, updated_at)
                             VALUES (?, ?, ?, ?, ?)
                         ''', (name, 0, 1, datetime.now(), datetime.now()))
-                        employees_added += 1
-                        print(f"DEBUG: Added employee: {name}")
+                        added += 1
+                        import_log.debug('Row %d: added employee %s', row_num, name)
                     else:
-                        print(f"DEBUG: Employee already exists: {name}")
+                        import_log.debug('Row %d: employee already exists: %s', row_num, name)
                         
                 except Exception as e:
                     error_msg = f"Row {row_num}: {str(e)}"
-                    errors.append(error_msg)
-                    print(f"DEBUG: Error adding employee: {error_msg}")
-            
-            conn.commit()
-            print(f"DEBUG: Committed {employees_added} new employees")
+                    row_errors.append(error_msg)
+                    import_log.warning('Error adding employee: %s', error_msg)
+            return added, row_errors
+        
+        employees_added, errors = db.write(insert_employees)
+        elapsed = time.perf_counter() - started
+        record_import(elapsed, employees_added, len(pending) - employees_added - len(errors), len(errors))
+        import_log.info('Import of %s complete: %d added, %d errors', file.filename, employees_added, len(errors),
+                        extra={'duration_ms': round(elapsed * 1000, 1)})
         
         result = {
             'success': True,
@@ -347,13 +386,11 @@ def import_excel():
             'names_found': names_found,
             'errors': errors
         }
-        print(f"DEBUG: Import result: {result}")
-        
         return jsonify(result)
         
     except Exception as e:
         error_msg = f'Import failed: {str(e)}'
-        print(f"DEBUG: Import exception: {error_msg}")
+        import_log.exception('Excel import failed')
         return jsonify({'success': False, 'error': error_msg}), 500
 
 if __name__ == '__main__':
@@ -1,16 +1,39 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import json
+import logging
 import os
-from datetime import datetime
+import time
+import uuid
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from openpyxl import load_workbook
 
 # Import our secure modules
 from config import config
-from database import db, DatabaseManager
-from auth import AuthManager, login_required, role_required
+from database import db, DatabaseManager, ROLLUP_GRAINS
+from auth import AuthManager, login_required, role_required, verified_tokens
+from hashing import HasherBusy, password_hasher
+from raffle import DrawEngine
+from pagination import EmployeePageRequest, PageRequestError
+from http_cache import conditional_get
+from events import ChangeFeed
+from cache import ResultCache
+from audit_archive import AuditArchive
+from backup import BackupJobs
+from backup_store import BackupStore
+from sql_timing import init_sql_timing
+from metrics import init_metrics, metrics_response, record_import
+from logs import init_logging, dropped_records
+import ratelimit_storage  # noqa: F401 - registers sqlite:// for RATELIMIT_STORAGE_URI
+
+# Structured logging through a background queue, configured before anything logs
+init_logging()
+app_log = logging.getLogger('raffle.app')
+employees_log = logging.getLogger('raffle.employees')
+import_log = logging.getLogger('raffle.import')
+auth_log = logging.getLogger('raffle.auth')
 
 # Create Flask app with configuration
 app = Flask(__name__)
@@ -24,7 +47,13 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
 app.config['SESSION_COOKIE_DOMAIN'] = None  # Let Flask handle domain automatically
 
-# Initialize rate limiter
+# Per-request SQL timing, reported in the Server-Timing header
+init_sql_timing(app)
+
+# Prometheus request metrics, served at /metrics
+init_metrics(app)
+
+# Initialize rate limiter; storage and strategy come from the RATELIMIT_* config
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["100 per hour"]
@@ -37,7 +66,7 @@ try:
     os.makedirs('data', exist_ok=True)
     os.makedirs('backups', exist_ok=True)
 except Exception as e:
-    print(f"Warning: Could not create directories: {e}")
+    app_log.warning('Could not create directories: %s', e)
 
 # Initialize database with error handling
 try:
@@ -47,16 +76,38 @@ try:
     if os.path.exists('raffle_data.json'):
         db_manager.migrate_from_json('raffle_data.json')
 except Exception as e:
-    print(f"Database initialization warning: {e}")
+    app_log.warning('Database initialization warning: %s', e)
     # Create a fallback minimal database manager
     db_manager = None
 
+# Server-side raffle draws, cached per data version
+draw_engine = DrawEngine(db)
+
+# Change events pushed to dashboards over /api/stream; this app's dashboard script subscribes to them
+change_feed = ChangeFeed(db)
+DASHBOARD_SCRIPT = 'js/script_complex.js'
+
+# Aggregate results shared between workers, keyed by data version
+result_cache = ResultCache()
+
+# Audit queries span the hot table and archived segments
+audit_archive = AuditArchive(db)
+
+# Online backups run in the background and are polled by job id
+backup_store = BackupStore(db)
+backup_jobs = BackupJobs(db, backup_store)
+
 # Security middleware
 @app.before_request
 def security_headers():
     # Add security headers
     pass
 
+@app.before_request
+def start_background_tasks():
+    # From the first request, so the thread runs in the worker rather than the gunicorn master
+    audit_archive.start_schedule()
+
 @app.after_request
 def after_request(response):
     # Add security headers
@@ -64,7 +115,7 @@ def after_request(response):
         for header, value in app.config.get('SECURITY_HEADERS', {}).items():
             response.headers[header] = value
     except Exception as e:
-        print(f"Security headers warning: {e}")
+        app_log.warning('Security headers warning: %s', e)
     return response
 
 def allowed_file(filename):
@@ -186,6 +237,113 @@ def process_excel_file(filepath):
             'error': str(e)
         }
 
+def fetch_recent_activities(conn, employee_ids=None, per_employee=10):
+    """Fetch the latest activities for active employees (or just employee_ids) in one set-based query"""
+    if employee_ids is None:
+        scope, params = 'JOIN employees e ON e.id = a.employee_id WHERE e.is_active = 1', []
+    else:
+        if not employee_ids:
+            return {}
+        scope = f"WHERE a.employee_id IN ({','.join('?' * len(employee_ids))})"
+        params = list(employee_ids)
+    
+    cursor = conn.execute(f'''
+        SELECT employee_id, activity_name, activity_category, entries_awarded, created_at
+        FROM (
+            SELECT a.employee_id, a.activity_name, a.activity_category, a.entries_awarded, a.created_at,
+                   ROW_NUMBER() OVER (PARTITION BY a.employee_id ORDER BY a.created_at DESC, a.id DESC) AS rn
+            FROM activities a
+            {scope}
+        )
+        WHERE rn <= ?
+        ORDER BY employee_id, rn
+    ''', params + [per_employee])
+    
+    recent = {}
+    for row in cursor.fetchall():
+        activity = dict(row)
+        recent.setdefault(activity.pop('employee_id'), []).append(activity)
+    return recent
+
+def build_dashboard_analytics(conn):
+    """Run the dashboard aggregate queries"""
+    # Total employees
+    cursor = conn.execute('SELECT COUNT(*) as total FROM employees WHERE is_active = 1')
+    total_employees = cursor.fetchone()['total']
+    
+    # Total entries
+    cursor = conn.execute('SELECT SUM(total_entries) as total FROM employees WHERE is_active = 1')
+    total_entries = cursor.fetchone()['total'] or 0
+    
+    # Recent activities
+    cursor = conn.execute('''
+        SELECT a.activity_name, a.entries_awarded, a.created_at, e.name as employee_name
+        FROM activities a
+        JOIN employees e ON a.employee_id = e.id
+        WHERE e.is_active = 1
+        ORDER BY a.created_at DESC
+        LIMIT 10
+    ''')
+    recent_activities = [dict(row) for row in cursor.fetchall()]
+    
+    # Top performers
+    cursor = conn.execute('''
+        SELECT name, total_entries, department
+        FROM employees 
+        WHERE is_active = 1 AND total_entries > 0
+        ORDER BY total_entries DESC
+        LIMIT 10
+    ''')
+    top_performers = [dict(row) for row in cursor.fetchall()]
+    
+    # Department breakdown (maintained incrementally by triggers)
+    cursor = conn.execute('''
+        SELECT department, employee_count, total_entries
+        FROM department_stats
+        ORDER BY total_entries DESC
+    ''')
+    department_stats = [dict(row) for row in cursor.fetchall()]
+    
+    return {
+        'total_employees': total_employees,
+        'total_entries': total_entries,
+        'recent_activities': recent_activities,
+        'top_performers': top_performers,
+        'department_stats': department_stats
+    }
+
+def build_activity_trends(conn, grain, start, end, department=None, category=None, group_by=None):
+    """Answer a trends range query from activity_rollups"""
+    dimensions = {'department': 'department', 'category': 'category'}
+    dimension = dimensions.get(group_by)
+    
+    filters = ['grain = ?', 'bucket_start BETWEEN ? AND ?']
+    params = [grain, start, end]
+    if department is not None:
+        filters.append('department = ?')
+        params.append(department)
+    if category is not None:
+        filters.append('category = ?')
+        params.append(category)
+    
+    select_dimension = f', {dimension}' if dimension else ''
+    cursor = conn.execute(f'''
+        SELECT bucket_start{select_dimension},
+               SUM(activity_count) as activity_count, SUM(entries_awarded) as entries_awarded
+        FROM activity_rollups
+        WHERE {' AND '.join(filters)}
+        GROUP BY bucket_start{select_dimension}
+        ORDER BY bucket_start{select_dimension}
+    ''', params)
+    
+    series = []
+    for row in cursor.fetchall():
+        point = dict(row)
+        if point.get('department') == '':
+            point['department'] = None
+        series.append(point)
+    return series
+
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
 @limiter.limit("5 per minute")
@@ -195,9 +353,14 @@ def login():
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         
-        success, message, user_data = AuthManager.login(
-            email, password, get_remote_address()
-        )
+        try:
+            success, message, user_data = AuthManager.login(
+                email, password, get_remote_address()
+            )
+        except HasherBusy:
+            auth_log.warning('Login refused: password hashing at capacity')
+            return jsonify({'success': False, 'message': 'Too many logins in progress, please retry'}), 503, \
+                {'Retry-After': '1'}
         
         if success:
             token = AuthManager.generate_token(user_data)
@@ -206,8 +369,7 @@ def login():
             session['user_id'] = user_data['id']
             session['user_role'] = user_data['role']
             
-            print(f"DEBUG: Login successful, session set: {session.get('access_token')[:20]}...")
-            print(f"DEBUG: Session ID: {session.sid if hasattr(session, 'sid') else 'No SID'}")
+            auth_log.debug('Login successful for user %s, session set', user_data['id'])
             
             return jsonify({
                 'success': True,
@@ -240,6 +402,12 @@ def logout():
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'Home Instead Raffle Dashboard is running'})
 
+# Prometheus scrape target, summed across gunicorn workers
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    return metrics_response()
+
 @app.route('/')
 def index():
     # Check if user is logged in
@@ -247,7 +415,7 @@ def index():
         try:
             token_data = AuthManager.verify_token(session['access_token'])
             if token_data:
-                return render_template('dashboard.html')
+                return render_template('dashboard.html', dashboard_script=DASHBOARD_SCRIPT)
         except:
             pass
     return redirect(url_for('login'))
@@ -255,56 +423,51 @@ def index():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', dashboard_script=DASHBOARD_SCRIPT)
 
 @app.route('/api/employees', methods=['GET'])
 @login_required
+@conditional_get
 def get_employees():
     try:
-        print("=== Get Employees API Debug ===")
-        with db.get_connection() as conn:
-            # First check total count
-            count_cursor = conn.execute('SELECT COUNT(*) as total FROM employees')
-            total_count = count_cursor.fetchone()['total']
-            print(f"Total employees in DB: {total_count}")
-            
-            # Check active count
-            active_cursor = conn.execute('SELECT COUNT(*) as active FROM employees WHERE is_active = 1')
-            active_count = active_cursor.fetchone()['active']
-            print(f"Active employees in DB: {active_count}")
-            
-            cursor = conn.execute('''
-                SELECT id, name, email, phone, department, position, 
-                       hire_date, photo_path, total_entries, is_active,
-                       created_at, updated_at
-                FROM employees WHERE is_active = 1
-                ORDER BY name
-            ''')
-            
-            employees = []
-            for row in cursor.fetchall():
-                employee = dict(row)
-                # Get recent activities
-                activity_cursor = conn.execute('''
-                    SELECT activity_name, activity_category, entries_awarded, created_at
-                    FROM activities WHERE employee_id = ?
-                    ORDER BY created_at DESC LIMIT 10
-                ''', (employee['id'],))
-                
-                employee['activities'] = [dict(activity) for activity in activity_cursor.fetchall()]
-                employees.append(employee)
-            
-            print(f"Returning {len(employees)} employees to frontend")
-            if len(employees) > 0:
-                print(f"First employee: {employees[0]['name']}")
-            
-            result = {'success': True, 'employees': employees}
+        page = EmployeePageRequest(request.args, computed_fields=('activities',))
+    except PageRequestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        with db.read_connection() as conn:
+            # The counts are diagnostics only, so skip the queries unless debug logging is on
+            if employees_log.isEnabledFor(logging.DEBUG):
+                total_count = conn.execute('SELECT COUNT(*) as total FROM employees').fetchone()['total']
+                active_count = conn.execute(
+                    'SELECT COUNT(*) as active FROM employees WHERE is_active = 1').fetchone()['active']
+                employees_log.debug('Employees in DB: %d total, %d active', total_count, active_count)
+            
+            employees, next_cursor = page.fetch(conn)
+            
+            # Recent activities are optional - list views that don't show them skip the work
+            include_activities = request.args.get('include_activities', 'true').lower() not in ('0', 'false', 'no')
+            if include_activities and page.wants('activities'):
+                # A full listing can join on is_active; a page only needs its own ids
+                page_ids = None if page.limit is None else [e['id'] for e in employees]
+                recent = fetch_recent_activities(conn, page_ids)
+                for employee in employees:
+                    employee['activities'] = recent.get(employee['id'], [])
+            
+            employees = page.project(employees)
+            
+            employees_log.debug('Returning %d employees', len(employees))
+            
+            result = {
+                'success': True,
+                'employees': employees,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
             return jsonify(result)
             
     except Exception as e:
-        print(f"Error in get_employees: {e}")
-        import traceback
-        traceback.print_exc()
+        employees_log.exception('Error in get_employees')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/employee', methods=['POST'])
@@ -326,11 +489,11 @@ def add_employee():
         if email and not AuthManager.validate_email(email):
             return jsonify({'success': False, 'error': 'Invalid email format'}), 400
         
-        with db.get_connection() as conn:
+        def insert_employee(conn):
             # Check if employee already exists
             cursor = conn.execute('SELECT id FROM employees WHERE name = ? OR (email = ? AND email != "")', (name, email))
             if cursor.fetchone():
-                return jsonify({'success': False, 'error': 'Employee already exists'}), 400
+                return None
             
             # Insert new employee
             cursor = conn.execute('''
@@ -339,19 +502,29 @@ def add_employee():
             ''', (name, email or None, phone or None, department or None, position or None, hire_date))
             
             employee_id = cursor.lastrowid
-            conn.commit()
-            
-            # Log the action
-            db.log_audit(
-                request.current_user['user_id'],
-                "Added employee",
-                "employees",
-                employee_id,
-                new_values=data,
-                ip_address=get_remote_address()
-            )
-            
-            return jsonify({'success': True, 'employee_id': employee_id})
+            change_feed.publish(conn, 'employee_added', {
+                'id': employee_id,
+                'name': name,
+                'department': department or None,
+                'total_entries': 0
+            })
+            return employee_id
+        
+        employee_id = db.write(insert_employee)
+        if employee_id is None:
+            return jsonify({'success': False, 'error': 'Employee already exists'}), 400
+        
+        # Log the action
+        db.log_audit(
+            request.current_user['user_id'],
+            "Added employee",
+            "employees",
+            employee_id,
+            new_values=data,
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({'success': True, 'employee_id': employee_id})
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -373,13 +546,15 @@ def add_entry(employee_id):
         if entries_awarded <= 0 or entries_awarded > 10:
             return jsonify({'success': False, 'error': 'Entries must be between 1 and 10'}), 400
         
-        with db.get_connection() as conn:
+        user_id = request.current_user['user_id']
+        
+        def award_entries(conn):
             # Check if employee exists
             cursor = conn.execute('SELECT id, name, total_entries FROM employees WHERE id = ? AND is_active = 1', (employee_id,))
             employee = cursor.fetchone()
             
             if not employee:
-                return jsonify({'success': False, 'error': 'Employee not found'}), 404
+                return None
             
             # Add activity
             cursor = conn.execute('''
@@ -387,34 +562,46 @@ def add_entry(employee_id):
                                       entries_awarded, awarded_by, notes)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (employee_id, activity_name, activity_category, entries_awarded, 
-                 request.current_user['user_id'], notes))
+                 user_id, notes))
+            activity_id = cursor.lastrowid
             
             # Update employee total entries
             new_total = employee['total_entries'] + entries_awarded
             conn.execute('UPDATE employees SET total_entries = ? WHERE id = ?', 
                         (new_total, employee_id))
             
-            conn.commit()
-            
-            # Log the action
-            db.log_audit(
-                request.current_user['user_id'],
-                f"Added {entries_awarded} raffle entries",
-                "activities",
-                cursor.lastrowid,
-                new_values={
-                    'employee_name': employee['name'],
-                    'activity': activity_name,
-                    'entries': entries_awarded
-                },
-                ip_address=get_remote_address()
-            )
-            
-            return jsonify({
-                'success': True, 
-                'message': f'Added {entries_awarded} entries for {activity_name}',
-                'new_total': new_total
+            change_feed.publish(conn, 'entry_awarded', {
+                'employee_id': employee_id,
+                'activity': activity_name,
+                'entries': entries_awarded,
+                'total_entries': new_total
             })
+            return employee['name'], activity_id, new_total
+        
+        result = db.write(award_entries)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Employee not found'}), 404
+        employee_name, activity_id, new_total = result
+        
+        # Log the action
+        db.log_audit(
+            user_id,
+            f"Added {entries_awarded} raffle entries",
+            "activities",
+            activity_id,
+            new_values={
+                'employee_name': employee_name,
+                'activity': activity_name,
+                'entries': entries_awarded
+            },
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({
+            'success': True, 
+            'message': f'Added {entries_awarded} entries for {activity_name}',
+            'new_total': new_total
+        })
             
     except ValueError:
         return jsonify({'success': False, 'error': 'Invalid entries value'}), 400
@@ -426,32 +613,37 @@ def add_entry(employee_id):
 @role_required('admin')
 def delete_employee(employee_id):
     try:
-        with db.get_connection() as conn:
+        def deactivate_employee(conn):
             # Get employee data before deletion
             cursor = conn.execute('SELECT name FROM employees WHERE id = ?', (employee_id,))
             employee = cursor.fetchone()
             
             if not employee:
-                return jsonify({'success': False, 'error': 'Employee not found'}), 404
+                return None
             
             # Soft delete - mark as inactive
             conn.execute('UPDATE employees SET is_active = 0 WHERE id = ?', (employee_id,))
-            conn.commit()
-            
-            # Log the action
-            db.log_audit(
-                request.current_user['user_id'],
-                "Deleted employee (soft delete)",
-                "employees",
-                employee_id,
-                old_values={'name': employee['name']},
-                ip_address=get_remote_address()
-            )
-            
-            return jsonify({
-                'success': True, 
-                'message': f'Employee {employee["name"]} has been removed'
-            })
+            change_feed.publish(conn, 'employee_deactivated', {'employee_id': employee_id})
+            return employee['name']
+        
+        employee_name = db.write(deactivate_employee)
+        if employee_name is None:
+            return jsonify({'success': False, 'error': 'Employee not found'}), 404
+        
+        # Log the action
+        db.log_audit(
+            request.current_user['user_id'],
+            "Deleted employee (soft delete)",
+            "employees",
+            employee_id,
+            old_values={'name': employee_name},
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({
+            'success': True, 
+            'message': f'Employee {employee_name} has been removed'
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -461,13 +653,15 @@ def delete_employee(employee_id):
 @role_required('admin')
 def reset_employee_points(employee_id):
     try:
-        with db.get_connection() as conn:
+        user_id = request.current_user['user_id']
+        
+        def reset_points(conn):
             # Get employee data
             cursor = conn.execute('SELECT name, total_entries FROM employees WHERE id = ? AND is_active = 1', (employee_id,))
             employee = cursor.fetchone()
             
             if not employee:
-                return jsonify({'success': False, 'error': 'Employee not found'}), 404
+                return None
             
             old_total = employee['total_entries']
             
@@ -480,25 +674,31 @@ def reset_employee_points(employee_id):
                                       entries_awarded, awarded_by, notes)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (employee_id, 'Points Reset', 'system', -old_total, 
-                 request.current_user['user_id'], f'Reset from {old_total} to 0'))
-            
-            conn.commit()
-            
-            # Log the action
-            db.log_audit(
-                request.current_user['user_id'],
-                "Reset employee points",
-                "employees",
-                employee_id,
-                old_values={'total_entries': old_total},
-                new_values={'total_entries': 0},
-                ip_address=get_remote_address()
-            )
+                 user_id, f'Reset from {old_total} to 0'))
             
-            return jsonify({
-                'success': True, 
-                'message': f'Reset {employee["name"]} points from {old_total} to 0'
-            })
+            change_feed.publish(conn, 'entries_reset', {'employee_id': employee_id, 'total_entries': 0})
+            return employee['name'], old_total
+        
+        result = db.write(reset_points)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Employee not found'}), 404
+        employee_name, old_total = result
+        
+        # Log the action
+        db.log_audit(
+            user_id,
+            "Reset employee points",
+            "employees",
+            employee_id,
+            old_values={'total_entries': old_total},
+            new_values={'total_entries': 0},
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({
+            'success': True, 
+            'message': f'Reset {employee_name} points from {old_total} to 0'
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -506,7 +706,7 @@ def reset_employee_points(employee_id):
 @app.route('/api/reset_all', methods=['POST'])
 @login_required
 @role_required('admin')
-@limiter.limit("1 per hour")
+@limiter.limit("1 per hour", deduct_when=lambda response: response.status_code == 200)
 def reset_all_data():
     """DANGEROUS: Reset all employee data - requires admin role and is rate limited"""
     try:
@@ -516,10 +716,26 @@ def reset_all_data():
         if confirmation != 'RESET_ALL_DATA':
             return jsonify({'success': False, 'error': 'Invalid confirmation'}), 400
         
-        with db.get_connection() as conn:
-            # Create backup before reset
-            backup_file = db.backup_database()
-            
+        user_id = request.current_user['user_id']
+        
+        # The reset never runs without a backup: it goes through the backup job queue like
+        # any other, and the reset waits a bounded time for that job to complete
+        job_id = backup_jobs.start(user_id, ip_address=get_remote_address())
+        job = backup_jobs.wait(job_id, app.config['RESET_BACKUP_TIMEOUT'])
+        if job is None or job['status'] == 'failed':
+            error = job['error'] if job else 'Backup job not found'
+            return jsonify({'success': False, 'error': f'Backup failed, nothing was reset: {error}',
+                            'job_id': job_id}), 500
+        if job['status'] != 'completed':
+            return jsonify({
+                'success': False,
+                'error': 'Backup is still running, nothing was reset - retry once it completes',
+                'job_id': job_id,
+                'status_url': url_for('get_backup_status', job_id=job_id)
+            }), 503
+        backup_file = job['backup_file']
+        
+        def reset_all(conn):
             # Mark all employees as inactive instead of deleting
             conn.execute('UPDATE employees SET is_active = 0')
             
@@ -529,24 +745,27 @@ def reset_all_data():
                                       entries_awarded, awarded_by, notes)
                 SELECT id, 'System Reset', 'system', -total_entries, ?, 'All data reset'
                 FROM employees WHERE total_entries > 0
-            ''', (request.current_user['user_id'],))
-            
-            conn.commit()
+            ''', (user_id,))
             
-            # Log the action
-            db.log_audit(
-                request.current_user['user_id'],
-                "SYSTEM RESET - All employee data reset",
-                "system",
-                notes=f"Backup created: {backup_file}",
-                ip_address=get_remote_address()
-            )
-            
-            return jsonify({
-                'success': True, 
-                'message': 'All employee data has been reset',
-                'backup_file': backup_file
-            })
+            change_feed.publish(conn, 'roster_reset', {})
+        
+        db.write(reset_all)
+        
+        # Log the action
+        db.log_audit(
+            user_id,
+            "SYSTEM RESET - All employee data reset",
+            "system",
+            notes=f"Backup created: {backup_file}",
+            ip_address=get_remote_address(),
+            sync=True
+        )
+        
+        return jsonify({
+            'success': True, 
+            'message': 'All employee data has been reset',
+            'backup_file': backup_file
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -556,106 +775,97 @@ def reset_all_data():
 @role_required('manager')
 @limiter.limit("5 per hour")
 def import_excel():
-    import traceback
     filepath = None
     
     try:
-        print("=== Excel Import Debug ===")
-        print(f"Request method: {request.method}")
-        print(f"Content type: {request.content_type}")
-        print(f"Files in request: {list(request.files.keys())}")
+        import_log.debug('Excel import started: content type %s, files %s',
+                         request.content_type, list(request.files.keys()))
         
         if 'file' not in request.files:
-            print("ERROR: No file in request")
+            import_log.info('Import rejected: no file in request')
             return jsonify({'success': False, 'error': 'No file uploaded'}), 400
         
         file = request.files['file']
-        print(f"File object: {file}")
-        print(f"Filename: {file.filename}")
         
         if file.filename == '':
-            print("ERROR: Empty filename")
+            import_log.info('Import rejected: empty filename')
             return jsonify({'success': False, 'error': 'No file selected'}), 400
         
         if not allowed_file(file.filename):
-            print(f"ERROR: File type not allowed: {file.filename}")
+            import_log.info('Import rejected: file type not allowed: %s', file.filename)
             return jsonify({'success': False, 'error': 'Invalid file type. Please upload .xlsx or .xls files only'}), 400
         
         # Check file size
         file_content = file.read()
-        print(f"File size: {len(file_content)} bytes")
         if len(file_content) > app.config['MAX_FILE_SIZE']:
-            print(f"ERROR: File too large: {len(file_content)} > {app.config['MAX_FILE_SIZE']}")
+            import_log.info('Import rejected: file too large: %d > %d bytes',
+                            len(file_content), app.config['MAX_FILE_SIZE'])
             return jsonify({'success': False, 'error': 'File too large'}), 400
         file.seek(0)  # Reset file pointer
         
         # Save uploaded file securely
         filename = secure_filename(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_filename = f"{timestamp}_{filename}"
+        # The random part keeps two uploads of the same file in the same second apart
+        safe_filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
         
         # Make sure upload directory exists
         upload_dir = app.config['UPLOAD_PATH']
-        print(f"Upload directory: {upload_dir}")
         if not os.path.exists(upload_dir):
-            print(f"Creating upload directory: {upload_dir}")
             os.makedirs(upload_dir, exist_ok=True)
         
         filepath = os.path.join(upload_dir, safe_filename)
-        print(f"Saving file to: {filepath}")
         file.save(filepath)
-        print(f"File saved successfully, size: {os.path.getsize(filepath)} bytes")
+        import_log.debug('Saved upload %s (%d bytes)', filepath, len(file_content))
         
         try:
             # Process the Excel file
-            print("Processing Excel file...")
+            started = time.perf_counter()
             result = process_excel_file(filepath)
-            print(f"Excel processing result: {result}")
             
             if not result['success']:
-                print(f"Excel processing failed: {result.get('error', 'Unknown error')}")
+                import_log.warning('Excel processing failed: %s', result.get('error', 'Unknown error'))
                 return jsonify({'success': False, 'error': f'Failed to process Excel file: {result["error"]}'}), 400
             
-            print(f"Found {len(result['employees'])} employees")
+            import_log.debug('Found %d employees in %s', len(result['employees']), filename)
             
             # Import employees to database
-            added_count = 0
-            skipped_count = 0
-            
-            print("Connecting to database...")
             if db_manager is None:
-                print("ERROR: Database manager is None")
+                import_log.error('Import failed: database manager is not available')
                 return jsonify({'success': False, 'error': 'Database not available'}), 500
                 
-            with db.get_connection() as conn:
-                print("Database connection established")
+            def import_employees(conn):
+                added, skipped = 0, 0
                 for i, employee_name in enumerate(result['employees']):
-                    print(f"Processing employee {i+1}/{len(result['employees'])}: {employee_name}")
-                    
                     # Check if employee already exists
                     cursor = conn.execute('SELECT id FROM employees WHERE name = ?', (employee_name,))
                     if cursor.fetchone():
-                        print(f"  Employee already exists: {employee_name}")
-                        skipped_count += 1
+                        import_log.debug('Row %d: employee already exists: %s', i + 1, employee_name)
+                        skipped += 1
                         continue
                     
                     # Insert new employee
-                    print(f"  Adding new employee: {employee_name}")
+                    import_log.debug('Row %d: adding employee: %s', i + 1, employee_name)
                     conn.execute('''
                         INSERT INTO employees (name, total_entries)
                         VALUES (?, ?)
                     ''', (employee_name, 0))
-                    added_count += 1
+                    added += 1
                 
-                print(f"Committing database changes...")
-                conn.commit()
-                print(f"Database commit successful")
+                if added:
+                    change_feed.publish(conn, 'employees_imported', {'added': added})
+                return added, skipped
             
-            print(f"Import complete: {added_count} added, {skipped_count} skipped")
+            # One transaction for the whole file, retried as a unit if the database is busy
+            added_count, skipped_count = db.write(import_employees)
+            elapsed = time.perf_counter() - started
+            record_import(elapsed, added_count, skipped_count)
+            
+            import_log.info('Import of %s complete: %d added, %d skipped', filename, added_count, skipped_count,
+                            extra={'duration_ms': round(elapsed * 1000, 1)})
             
             # Log the import
             try:
-                print("Logging audit entry...")
                 db.log_audit(
                     session.get('user_id'),
                     f"Excel import: {added_count} employees added",
@@ -667,9 +877,8 @@ def import_excel():
                     },
                     ip_address=get_remote_address()
                 )
-                print("Audit log entry created")
             except Exception as audit_error:
-                print(f"Audit logging failed (non-critical): {audit_error}")
+                import_log.warning('Audit logging failed (non-critical): %s', audit_error)
             
             return jsonify({
                 'success': True,
@@ -687,26 +896,21 @@ def import_excel():
         finally:
             # Clean up uploaded file
             if filepath and os.path.exists(filepath):
-                print(f"Cleaning up file: {filepath}")
                 try:
                     os.remove(filepath)
-                    print("File cleanup successful")
                 except Exception as cleanup_error:
-                    print(f"File cleanup failed: {cleanup_error}")
+                    import_log.warning('File cleanup failed for %s: %s', filepath, cleanup_error)
         
     except Exception as e:
         error_msg = f'An error occurred: {str(e)}'
-        print(f"ERROR: {error_msg}")
-        print("Traceback:")
-        traceback.print_exc()
+        import_log.exception('Excel import failed')
         
         # Clean up file on error
         if filepath and os.path.exists(filepath):
             try:
                 os.remove(filepath)
-                print("Error cleanup: File removed")
             except:
-                print("Error cleanup: Failed to remove file")
+                import_log.warning('Error cleanup: failed to remove %s', filepath)
         
         return jsonify({'success': False, 'error': error_msg}), 500
 
@@ -715,45 +919,19 @@ def import_excel():
 @login_required
 @role_required('manager')
 def conduct_raffle():
-    """Conduct a raffle and record the winner"""
+    """Draw a weighted winner server-side"""
     try:
-        data = request.get_json()
-        prize = data.get('prize', 'Quarterly Prize')
-        
-        with db.get_connection() as conn:
-            # Get all eligible employees (with entries > 0)
-            cursor = conn.execute('''
-                SELECT id, name, total_entries 
-                FROM employees 
-                WHERE is_active = 1 AND total_entries > 0
-                ORDER BY name
-            ''')
-            
-            eligible_employees = cursor.fetchall()
-            
-            if not eligible_employees:
+        with db.read_connection() as conn:
+            try:
+                winner, snapshot = draw_engine.draw(conn)
+            except ValueError:
                 return jsonify({'success': False, 'error': 'No eligible employees found'}), 400
             
-            # Calculate total entries and chances
-            total_entries = sum(emp['total_entries'] for emp in eligible_employees)
-            participants = []
-            
-            for emp in eligible_employees:
-                chance = (emp['total_entries'] / total_entries) * 100
-                participants.append({
-                    'id': emp['id'],
-                    'name': emp['name'],
-                    'entries': emp['total_entries'],
-                    'chance': round(chance, 2)
-                })
-            
-            # For now, return the data for client-side selection
-            # In a real implementation, you might want to do server-side selection
             return jsonify({
                 'success': True,
-                'participants': participants,
-                'total_entries': total_entries,
-                'total_participants': len(participants)
+                'winner': winner,
+                'total_entries': snapshot.total_entries,
+                'total_participants': len(snapshot.participants)
             })
             
     except Exception as e:
@@ -775,13 +953,15 @@ def record_raffle_winner():
         if not winner_id:
             return jsonify({'success': False, 'error': 'Winner ID is required'}), 400
         
-        with db.get_connection() as conn:
+        user_id = request.current_user['user_id']
+        
+        def insert_result(conn):
             # Verify winner exists
             cursor = conn.execute('SELECT name FROM employees WHERE id = ? AND is_active = 1', (winner_id,))
             winner = cursor.fetchone()
             
             if not winner:
-                return jsonify({'success': False, 'error': 'Invalid winner ID'}), 400
+                return None
             
             # Record raffle result
             cursor = conn.execute('''
@@ -789,115 +969,304 @@ def record_raffle_winner():
                 (winner_id, prize, total_participants, total_entries, winning_chance, conducted_by)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (winner_id, prize, total_participants, total_entries, winning_chance, 
-                 request.current_user['user_id']))
+                 user_id))
             
             raffle_id = cursor.lastrowid
-            conn.commit()
-            
-            # Log the raffle
-            db.log_audit(
-                request.current_user['user_id'],
-                f"Conducted raffle - Winner: {winner['name']}",
-                "raffle_history",
-                raffle_id,
-                new_values={
-                    'winner': winner['name'],
-                    'prize': prize,
-                    'participants': total_participants
-                },
-                ip_address=get_remote_address()
-            )
-            
-            return jsonify({
-                'success': True,
-                'message': f'Raffle completed! Winner: {winner["name"]}',
+            change_feed.publish(conn, 'winner_recorded', {
+                'raffle_id': raffle_id,
+                'winner_id': winner_id,
                 'winner_name': winner['name'],
-                'raffle_id': raffle_id
+                'prize': prize
             })
+            return winner['name'], raffle_id
+        
+        result = db.write(insert_result)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Invalid winner ID'}), 400
+        winner_name, raffle_id = result
+        
+        # Log the raffle
+        db.log_audit(
+            user_id,
+            f"Conducted raffle - Winner: {winner_name}",
+            "raffle_history",
+            raffle_id,
+            new_values={
+                'winner': winner_name,
+                'prize': prize,
+                'participants': total_participants
+            },
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'Raffle completed! Winner: {winner_name}',
+            'winner_name': winner_name,
+            'raffle_id': raffle_id
+        })
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/raffle/conduct_batch', methods=['POST'])
+@login_required
+@role_required('manager')
+def conduct_raffle_batch():
+    """Draw several distinct winners in one call and record them all"""
+    try:
+        data = request.get_json() or {}
+        prizes = data.get('prizes')
+        
+        if prizes is None:
+            count = int(data.get('count', 1))
+            prizes = [data.get('prize', 'Quarterly Prize')] * count
+        
+        if not isinstance(prizes, list) or not prizes:
+            return jsonify({'success': False, 'error': 'At least one prize is required'}), 400
+        
+        if len(prizes) > 100:
+            return jsonify({'success': False, 'error': 'A batch draw is limited to 100 prizes'}), 400
+        
+        if not all(isinstance(prize, str) and prize.strip() and len(prize) <= 200 for prize in prizes):
+            return jsonify({'success': False, 'error': 'Each prize must be a name of 1 to 200 characters'}), 400
+        prizes = [prize.strip() for prize in prizes]
+        
+        user_id = request.current_user['user_id']
+        
+        # Built (or taken from cache) on a read connection, so the writer only has to
+        # check it is still current instead of rebuilding the table for every batch
+        with db.read_connection() as conn:
+            prepared = draw_engine.snapshot(conn)
+        
+        def draw_and_record(conn):
+            # Drawn inside the write transaction, so every winner is still eligible at commit
+            winners, snapshot = draw_engine.draw_many(conn, len(prizes), prepared=prepared)
+            
+            # Record every winner in a single transaction
+            raffle_ids = []
+            for winner, prize in zip(winners, prizes):
+                cursor = conn.execute('''
+                    INSERT INTO raffle_history 
+                    (winner_id, prize, total_participants, total_entries, winning_chance, conducted_by)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (winner['id'], prize, len(snapshot.participants), snapshot.total_entries,
+                     winner['chance'], user_id))
+                winner['prize'] = prize
+                winner['raffle_id'] = cursor.lastrowid
+                raffle_ids.append(cursor.lastrowid)
+                change_feed.publish(conn, 'winner_recorded', {
+                    'raffle_id': cursor.lastrowid,
+                    'winner_id': winner['id'],
+                    'winner_name': winner['name'],
+                    'prize': prize
+                })
+            return winners, snapshot, raffle_ids
+        
+        try:
+            winners, snapshot, raffle_ids = db.write(draw_and_record)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Log the raffle
+        db.log_audit(
+            user_id,
+            f"Conducted batch raffle - {len(winners)} winners",
+            "raffle_history",
+            raffle_ids[0],
+            new_values={
+                'winners': [w['name'] for w in winners],
+                'prizes': prizes,
+                'participants': len(snapshot.participants)
+            },
+            ip_address=get_remote_address()
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'Raffle completed! {len(winners)} winners drawn',
+            'winners': winners,
+            'total_entries': snapshot.total_entries,
+            'total_participants': len(snapshot.participants)
+        })
             
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid prize count'}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/stream')
+@login_required
+def event_stream():
+    """Server-Sent Events feed of roster and raffle changes"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    # Every open stream holds a worker thread, so past the cap clients are turned away
+    # rather than left to starve ordinary requests of threads
+    if not change_feed.acquire_stream():
+        return jsonify({'success': False, 'error': 'Too many live update streams open, retry later'}), 503, \
+            {'Retry-After': str(app.config['EVENT_STREAM_RETRY_SECONDS'])}
+    
+    response = Response(
+        change_feed.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(change_feed.release_stream)
+    return response
+
 @app.route('/api/analytics/dashboard', methods=['GET'])
 @login_required
+@conditional_get
 def analytics_dashboard():
     """Get analytics data for dashboard"""
     try:
-        with db.get_connection() as conn:
-            # Total employees
-            cursor = conn.execute('SELECT COUNT(*) as total FROM employees WHERE is_active = 1')
-            total_employees = cursor.fetchone()['total']
+        with db.read_connection() as conn:
+            # Cached per data version - only employee/activity writes invalidate it. The epoch
+            # keeps entries from a restored or recreated database, whose versions start again
+            # from older numbers, from matching
+            version = db.get_data_version(conn)
+            epoch = db.get_data_epoch(conn)
+            analytics = result_cache.get_or_compute(
+                f'analytics:dashboard:{epoch}', version, lambda: build_dashboard_analytics(conn)
+            )
             
-            # Total entries
-            cursor = conn.execute('SELECT SUM(total_entries) as total FROM employees WHERE is_active = 1')
-            total_entries = cursor.fetchone()['total'] or 0
+            return jsonify({
+                'success': True,
+                'analytics': analytics
+            })
             
-            # Recent activities
-            cursor = conn.execute('''
-                SELECT a.activity_name, a.entries_awarded, a.created_at, e.name as employee_name
-                FROM activities a
-                JOIN employees e ON a.employee_id = e.id
-                WHERE e.is_active = 1
-                ORDER BY a.created_at DESC
-                LIMIT 10
-            ''')
-            recent_activities = [dict(row) for row in cursor.fetchall()]
-            
-            # Top performers
-            cursor = conn.execute('''
-                SELECT name, total_entries, department
-                FROM employees 
-                WHERE is_active = 1 AND total_entries > 0
-                ORDER BY total_entries DESC
-                LIMIT 10
-            ''')
-            top_performers = [dict(row) for row in cursor.fetchall()]
-            
-            # Department breakdown
-            cursor = conn.execute('''
-                SELECT department, COUNT(*) as employee_count, SUM(total_entries) as total_entries
-                FROM employees 
-                WHERE is_active = 1 AND department IS NOT NULL
-                GROUP BY department
-                ORDER BY total_entries DESC
-            ''')
-            department_stats = [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _trends_range():
+    """The (start, end) dates a trends request covers; end defaults to today (UTC)"""
+    end = request.args.get('end') or datetime.utcnow().strftime('%Y-%m-%d')
+    start = request.args.get('start') or (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=365)).strftime('%Y-%m-%d')
+    datetime.strptime(start, '%Y-%m-%d')
+    datetime.strptime(end, '%Y-%m-%d')
+    return start, end
+
+def _trends_validator():
+    # The default window moves with the date, so yesterday's ETag must not match today's range
+    try:
+        return '%s:%s' % _trends_range()
+    except ValueError:
+        return 'invalid'
+
+@app.route('/api/analytics/trends', methods=['GET'])
+@login_required
+@conditional_get(validator=_trends_validator)
+def analytics_trends():
+    """Entries and activity counts per day/week/month/quarter, served from rollups"""
+    grain = request.args.get('grain', 'week')
+    if grain not in ROLLUP_GRAINS:
+        return jsonify({'success': False, 'error': f"Invalid grain. Use one of: {', '.join(ROLLUP_GRAINS)}"}), 400
+    
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'department', 'category'):
+        return jsonify({'success': False, 'error': 'group_by must be department or category'}), 400
+    
+    try:
+        start, end = _trends_range()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    
+    # Rollups store a missing department as ''
+    department = request.args.get('department')
+    category = request.args.get('category')
+    
+    try:
+        with db.read_connection() as conn:
+            version = db.get_data_version(conn)
+            epoch = db.get_data_epoch(conn)
+            cache_key = f'analytics:trends:{epoch}:{grain}:{start}:{end}:{department}:{category}:{group_by}'
+            series = result_cache.get_or_compute(
+                cache_key, version,
+                lambda: build_activity_trends(conn, grain, start, end, department, category, group_by)
+            )
             
             return jsonify({
                 'success': True,
-                'analytics': {
-                    'total_employees': total_employees,
-                    'total_entries': total_entries,
-                    'recent_activities': recent_activities,
-                    'top_performers': top_performers,
-                    'department_stats': department_stats
-                }
+                'grain': grain,
+                'start': start,
+                'end': end,
+                'series': series
             })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/audit', methods=['GET'])
+@login_required
+@role_required('admin')
+def query_audit_log():
+    """Search the audit trail across hot and archived records"""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 500)
+        user_id = request.args.get('user_id')
+        user_id = int(user_id) if user_id else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit and user_id must be integers'}), 400
+    
+    try:
+        records = audit_archive.query(
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            user_id=user_id,
+            action=request.args.get('action'),
+            limit=limit
+        )
+        return jsonify({'success': True, 'records': records})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/stats/database', methods=['GET'])
+@login_required
+@role_required('admin')
+def database_stats():
+    """Connection pool and writer statistics for this worker"""
+    return jsonify({'success': True, 'pid': os.getpid(), **db.connection_stats(),
+                    'token_cache': verified_tokens.stats(), 'password_hashing': password_hasher.stats(),
+                    'log_records_dropped': dropped_records()})
+
 @app.route('/api/backup', methods=['POST'])
 @login_required
 @role_required('admin')
 def create_backup():
-    """Create a database backup"""
+    """Start a database backup in the background"""
     try:
-        backup_file = db.backup_database()
-        
-        # Log the backup
-        db.log_audit(
+        job_id = backup_jobs.start(
             request.current_user['user_id'],
-            "Database backup created",
-            notes=f"Backup file: {backup_file}",
             ip_address=get_remote_address()
         )
         
         return jsonify({
             'success': True,
-            'message': 'Backup created successfully',
-            'backup_file': os.path.basename(backup_file)
-        })
+            'message': 'Backup started',
+            'job_id': job_id,
+            'status_url': url_for('get_backup_status', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/backup/<job_id>', methods=['GET'])
+@login_required
+@role_required('admin')
+def get_backup_status(job_id):
+    """Report progress of a background backup"""
+    try:
+        job = backup_jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Backup job not found'}), 404
+        
+        return jsonify({'success': True, 'job': job})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
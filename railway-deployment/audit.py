@@ -0,0 +1,153 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import List, Tuple
+from config import Config
+
+log = logging.getLogger('raffle.audit')
+
+INSERT_AUDIT_SQL = '''
+    INSERT INTO audit_log
+    (user_id, action, table_name, record_id, old_values, new_values, ip_address, user_agent, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+class _FlushMarker:
+    """Queued behind the records a flush must wait for; the writer thread sets done once they commit"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+class AuditWriter:
+    """Queues audit records in memory and writes them in batches on a background thread"""
+
+    def __init__(self, write_queue, batch_size: int = None, flush_interval: float = None,
+                 max_queue: int = None):
+        self.write_queue = write_queue
+        self.batch_size = batch_size or Config.AUDIT_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.AUDIT_FLUSH_INTERVAL
+        self.max_queue = max_queue or Config.AUDIT_QUEUE_MAX
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._write_lock = threading.Lock()
+        self._retry = []  # records from a failed write, written ahead of the next batch
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        atexit.register(self.close)
+
+    def _running(self) -> bool:
+        return (self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+                and not self._stopping.is_set())
+
+    def _ensure_started(self):
+        """Start the flush thread lazily so it is created in the worker, not the gunicorn master"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, record: Tuple):
+        """Queue a record; falls back to a synchronous write if the queue is full"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._commit([record])
+
+    def write(self, records: List[Tuple]):
+        """Write records in one transaction, returning once they are committed"""
+        if not records:
+            return
+        self.write_queue.execute(lambda conn: conn.executemany(INSERT_AUDIT_SQL, records))
+
+    def _commit(self, records: List[Tuple], markers: List[_FlushMarker] = ()):
+        """Write records behind any earlier failed ones, then release the flushes waiting on them"""
+        error = None
+        with self._write_lock:
+            records = self._retry + records
+            self._retry = []
+            try:
+                self.write(records)
+            except Exception as e:
+                error = e
+                # Kept for the next write rather than dropped, up to a queue's worth
+                self._retry = records[-self.max_queue:]
+                log.error('Audit write failed, %d records kept for retry (%d dropped): %s',
+                          len(self._retry), len(records) - len(self._retry), e)
+        for marker in markers:
+            marker.error = error
+            marker.done.set()
+        if error is not None:
+            raise error
+
+    def flush(self):
+        """Block until everything queued so far is committed; raises if that write failed"""
+        if self._running():
+            # The writer thread is the only one taking records off the queue, so everything
+            # ahead of the marker - including a batch it is already gathering - commits first
+            marker = _FlushMarker()
+            self._queue.put(marker)
+            while not marker.done.wait(1.0):
+                if not self._running():
+                    break
+            if marker.done.is_set():
+                if marker.error is not None:
+                    raise marker.error
+                return
+
+        # No writer thread in this process (closed, or never started): drain here
+        records, markers = [], []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            (markers if isinstance(item, _FlushMarker) else records).append(item)
+        self._commit(records, markers)
+
+    def write_now(self, records: List[Tuple]):
+        """Write records synchronously behind any kept for retry; raises if the write fails"""
+        self._commit(records)
+
+    def _run(self):
+        """Flush when a batch fills up, the oldest queued record reaches the flush interval or a flush asks"""
+        while not self._stopping.is_set():
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch, markers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                (markers if isinstance(item, _FlushMarker) else batch).append(item)
+                if markers or len(batch) >= self.batch_size or self._stopping.is_set():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit(batch, markers)
+            except Exception:
+                pass  # Logged and kept for retry by _commit; waiting flushes get the error
+
+    def close(self):
+        """Stop the flush thread and drain anything still queued"""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5.0)
+        self.flush()
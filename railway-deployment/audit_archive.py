@@ -0,0 +1,210 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+log = logging.getLogger('raffle.audit')
+
+AUDIT_COLUMNS = ('id', 'user_id', 'action', 'table_name', 'record_id', 'old_values',
+                 'new_values', 'ip_address', 'user_agent', 'created_at')
+
+class AuditArchive:
+    """Moves old audit_log rows into compressed, append-only segment files"""
+
+    def __init__(self, database, archive_path: str = None):
+        self.database = database
+        self.archive_path = archive_path or Config.AUDIT_ARCHIVE_PATH
+        self.interval = Config.AUDIT_ARCHIVE_INTERVAL
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.makedirs(self.archive_path, exist_ok=True)
+
+    def archive(self, older_than_days: int = None) -> Dict:
+        """Archive every audit row older than the retention window, one segment per batch"""
+        days = older_than_days if older_than_days is not None else Config.AUDIT_RETENTION_DAYS
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+        # Queued audit records must reach the table before we decide what is old
+        self.database.audit_writer.flush()
+
+        segments = 0
+        rows_archived = 0
+        while True:
+            with self.database.read_connection() as conn:
+                cursor = conn.execute(f'''
+                    SELECT {', '.join(AUDIT_COLUMNS)} FROM audit_log
+                    WHERE created_at < ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (cutoff, Config.AUDIT_SEGMENT_MAX_ROWS))
+                rows = [dict(row) for row in cursor.fetchall()]
+            if not rows:
+                break
+
+            filename = self._write_segment(rows)
+            self.database.write(self._commit_segment, filename, rows, cutoff)
+
+            segments += 1
+            rows_archived += len(rows)
+
+        return {'segments': segments, 'rows_archived': rows_archived, 'cutoff': cutoff}
+
+    def archive_if_due(self) -> Optional[Dict]:
+        """Run archive() unless some process already did within the archive interval"""
+        def claim(conn):
+            # Stamped in settings, so of all the workers only the first one due runs it
+            now = time.time()
+            row = conn.execute("SELECT value FROM settings WHERE key = 'audit_archived_at'").fetchone()
+            if row and now - float(row[0]) < self.interval:
+                return False
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('audit_archived_at', ?)",
+                         (str(now),))
+            return True
+
+        if self.interval <= 0 or not self.database.write(claim):
+            return None
+        return self.archive()
+
+    def start_schedule(self):
+        """Start the thread that applies the retention window every AUDIT_ARCHIVE_INTERVAL seconds"""
+        if self.interval <= 0 or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._start_lock:
+            # Threads do not survive a fork, so each gunicorn worker starts its own
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run_schedule, name='audit-archive', daemon=True)
+                self._thread.start()
+
+    def _run_schedule(self):
+        while True:
+            try:
+                result = self.archive_if_due()
+                if result and result['rows_archived']:
+                    log.info('Archived %d audit rows older than %s into %d segments',
+                             result['rows_archived'], result['cutoff'], result['segments'])
+            except Exception:
+                log.exception('Scheduled audit archive failed')
+            time.sleep(min(self.interval, 600))
+
+    def _write_segment(self, rows: List[Dict]) -> str:
+        """Write rows to a gzip'd JSON-lines file and fsync it before the hot rows are deleted"""
+        # Named by id range, so a run interrupted before the commit simply rewrites the same file
+        filename = f"audit_{rows[0]['id']:012d}_{rows[-1]['id']:012d}.jsonl.gz"
+        path = os.path.join(self.archive_path, filename)
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as gz:
+                for row in rows:
+                    gz.write(json.dumps(row, separators=(',', ':')).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return filename
+
+    def _commit_segment(self, conn, filename: str, rows: List[Dict], cutoff: str):
+        """Index the segment and remove its rows from the hot table (runs as one write job)"""
+        conn.execute('DELETE FROM audit_segments WHERE filename = ?', (filename,))
+        cursor = conn.execute('''
+            INSERT INTO audit_segments
+            (filename, row_count, min_id, max_id, min_created_at, max_created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (filename, len(rows), rows[0]['id'], rows[-1]['id'],
+              min(r['created_at'] for r in rows), max(r['created_at'] for r in rows)))
+        segment_id = cursor.lastrowid
+
+        user_ids = {r['user_id'] for r in rows if r['user_id'] is not None}
+        conn.executemany('INSERT OR IGNORE INTO audit_segment_users (user_id, segment_id) VALUES (?, ?)',
+                         [(user_id, segment_id) for user_id in user_ids])
+
+        # Exactly the rows that were selected: the first N by id among those older than cutoff
+        conn.execute('DELETE FROM audit_log WHERE created_at < ? AND id <= ?', (cutoff, rows[-1]['id']))
+
+    def _read_segment(self, filename: str) -> List[Dict]:
+        """Load every row from a segment file"""
+        with gzip.open(os.path.join(self.archive_path, filename), 'rb') as gz:
+            return [json.loads(line) for line in gz]
+
+    @staticmethod
+    def _end_bound(end: str) -> Tuple[str, bool]:
+        """created_at upper bound for end, and whether it is exclusive"""
+        # created_at is 'YYYY-MM-DD HH:MM:SS', so a bare date compared as a string would
+        # sort before every row of that day; it means up to the start of the next day
+        try:
+            day = datetime.strptime(end, '%Y-%m-%d')
+        except ValueError:
+            return end, False
+        return (day + timedelta(days=1)).strftime('%Y-%m-%d'), True
+
+    def query(self, start: str = None, end: str = None, user_id: Optional[int] = None,
+              action: str = None, limit: int = 100) -> List[Dict]:
+        """Return audit rows newest first, spanning the hot table and archived segments"""
+        if end:
+            end, end_exclusive = self._end_bound(end)
+        filters, params = [], []
+        if start:
+            filters.append('created_at >= ?')
+            params.append(start)
+        if end:
+            filters.append('created_at < ?' if end_exclusive else 'created_at <= ?')
+            params.append(end)
+        if user_id is not None:
+            filters.append('user_id = ?')
+            params.append(user_id)
+        if action:
+            filters.append('action = ?')
+            params.append(action)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ''
+
+        with self.database.read_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT {', '.join(AUDIT_COLUMNS)} FROM audit_log {where}
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', params + [limit])
+            results = [dict(row) for row in cursor.fetchall()]
+
+            # Candidate segments from the index, newest first
+            seg_filters, seg_params = [], []
+            if start:
+                seg_filters.append('s.max_created_at >= ?')
+                seg_params.append(start)
+            if end:
+                seg_filters.append('s.min_created_at < ?' if end_exclusive else 's.min_created_at <= ?')
+                seg_params.append(end)
+            if user_id is not None:
+                seg_filters.append('s.id IN (SELECT segment_id FROM audit_segment_users WHERE user_id = ?)')
+                seg_params.append(user_id)
+            seg_where = f"WHERE {' AND '.join(seg_filters)}" if seg_filters else ''
+            segments = conn.execute(f'''
+                SELECT s.filename, s.max_created_at FROM audit_segments s {seg_where}
+                ORDER BY s.max_created_at DESC, s.max_id DESC
+            ''', seg_params).fetchall()
+
+        for segment in segments:
+            # Stop once every remaining segment is older than the rows we already hold
+            if len(results) >= limit and segment['max_created_at'] < results[limit - 1]['created_at']:
+                break
+
+            for row in self._read_segment(segment['filename']):
+                if start and row['created_at'] < start:
+                    continue
+                if end and (row['created_at'] >= end if end_exclusive else row['created_at'] > end):
+                    continue
+                if user_id is not None and row['user_id'] != user_id:
+                    continue
+                if action and row['action'] != action:
+                    continue
+                row['archived'] = True
+                results.append(row)
+
+            results.sort(key=lambda r: (r['created_at'], r['id']), reverse=True)
+            del results[limit:]
+
+        return results[:limit]
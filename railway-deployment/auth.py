@@ -1,4 +1,4 @@
-import bcrypt
+import logging
 import jwt
 import re
 from datetime import datetime, timedelta
@@ -7,6 +7,13 @@ from typing import Dict, Optional, Tuple
 from flask import request, jsonify, current_app
 from database import db
 from config import Config
+from hashing import HasherBusy, password_hasher
+from token_cache import TokenCache
+
+log = logging.getLogger('raffle.auth')
+
+# Tokens this worker has already verified, with the user data they carry
+verified_tokens = TokenCache()
 
 class AuthManager:
     """Simplified authentication manager for Railway deployment"""
@@ -26,34 +33,52 @@ class AuthManager:
     @staticmethod
     def verify_token(token: str) -> Optional[Dict]:
         """Verify JWT token and return user data"""
+        user_data = verified_tokens.get(token)
+        if user_data is not None:
+            return user_data
+        
         try:
             payload = jwt.decode(token, current_app.config['JWT_SECRET'], algorithms=['HS256'])
             
             # Check if token is close to expiry (within 30 minutes) and log it
-            exp_time = datetime.utcfromtimestamp(payload['exp'])
-            time_until_exp = exp_time - datetime.utcnow()
-            
-            if time_until_exp.total_seconds() < 1800:  # Less than 30 minutes
-                print(f"DEBUG: Token for {payload['email']} expires in {time_until_exp}")
+            if log.isEnabledFor(logging.DEBUG):
+                time_until_exp = datetime.utcfromtimestamp(payload['exp']) - datetime.utcnow()
+                if time_until_exp.total_seconds() < 1800:  # Less than 30 minutes
+                    log.debug('Token for %s expires in %s', payload['email'], time_until_exp)
             
-            return {
+            user_data = {
                 'id': payload['id'],
                 'email': payload['email'], 
                 'role': payload['role'],
                 'exp': payload['exp']
             }
+            verified_tokens.put(token, user_data, payload['exp'])
+            return user_data
         except jwt.ExpiredSignatureError:
-            print(f"DEBUG: Token expired for token: {token[:20]}...")
+            log.debug('Expired token presented')
             return None
         except jwt.InvalidTokenError as e:
-            print(f"DEBUG: Invalid token error: {e}")
+            log.debug('Invalid token: %s', e)
             return None
     
+    @staticmethod
+    def _upgrade_hash(user_id: int, password: str, old_hash: str):
+        """Re-hash a just-verified password when the configured work factor has changed"""
+        if not password_hasher.needs_rehash(old_hash):
+            return
+        try:
+            new_hash = password_hasher.hash(password)
+        except HasherBusy:
+            return  # The next login tries again; this one should not wait for it
+        # Matching the old hash too, so a password changed meanwhile is not overwritten
+        db.write(lambda w: w.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                                     (new_hash, user_id, old_hash)))
+    
     @staticmethod
     def login(email: str, password: str, ip_address: str = None) -> Tuple[bool, str, Optional[Dict]]:
         """Authenticate user credentials"""
         try:
-            with db.get_connection() as conn:
+            with db.read_connection() as conn:
                 cursor = conn.execute(
                     'SELECT id, email, password_hash, role, name, is_active FROM users WHERE email = ?', 
                     (email,)
@@ -67,7 +92,9 @@ class AuthManager:
                     return False, "Account is disabled", None
                 
                 # Check password
-                if bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+                if password_hasher.verify(password, user['password_hash']):
+                    AuthManager._upgrade_hash(user['id'], password, user['password_hash'])
+                    
                     user_data = {
                         'id': user['id'],
                         'email': user['email'],
@@ -83,8 +110,11 @@ class AuthManager:
                 else:
                     return False, "Invalid credentials", None
                     
+        except HasherBusy:
+            # Not a login failure; the caller answers 503 so the client retries
+            raise
         except Exception as e:
-            print(f"Login error: {e}")
+            log.exception('Login error')
             return False, "Login error occurred", None
 
 def login_required(f):
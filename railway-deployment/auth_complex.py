@@ -1,4 +1,4 @@
-import bcrypt
+import logging
 import jwt
 import re
 from datetime import datetime, timedelta
@@ -7,6 +7,13 @@ from typing import Dict, Optional, Tuple
 from flask import request, jsonify, session, current_app
 from database import db
 from config import Config
+from hashing import HasherBusy, password_hasher
+from token_cache import TokenCache
+
+log = logging.getLogger('raffle.auth')
+
+# Tokens this worker has already verified, with their decoded claims
+verified_tokens = TokenCache()
 
 class AuthManager:
     """Secure authentication manager with JWT and session handling"""
@@ -14,12 +21,12 @@ class AuthManager:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash a password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return password_hasher.hash(password)
     
     @staticmethod
     def verify_password(password: str, password_hash: str) -> bool:
         """Verify a password against its hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        return password_hasher.verify(password, password_hash)
     
     @staticmethod
     def validate_password(password: str) -> Tuple[bool, str]:
@@ -62,14 +69,32 @@ class AuthManager:
     @staticmethod
     def verify_token(token: str) -> Optional[Dict]:
         """Verify JWT token and return user data"""
+        payload = verified_tokens.get(token)
+        if payload is not None:
+            return payload
+        
         try:
             payload = jwt.decode(token, Config.JWT_SECRET, algorithms=['HS256'])
+            verified_tokens.put(token, payload, payload['exp'])
             return payload
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
     
+    @staticmethod
+    def _upgrade_hash(user_id: int, password: str, old_hash: str):
+        """Re-hash a just-verified password when the configured work factor has changed"""
+        if not password_hasher.needs_rehash(old_hash):
+            return
+        try:
+            new_hash = password_hasher.hash(password)
+        except HasherBusy:
+            return  # The next login tries again; this one should not wait for it
+        # Matching the old hash too, so a password changed meanwhile is not overwritten
+        db.write(lambda w: w.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                                     (new_hash, user_id, old_hash)))
+    
     @staticmethod
     def login(email: str, password: str, ip_address: str = None) -> Tuple[bool, str, Optional[Dict]]:
         """Authenticate user login"""
@@ -79,7 +104,7 @@ class AuthManager:
         if not AuthManager.validate_email(email):
             return False, "Invalid email format", None
         
-        with db.get_connection() as conn:
+        with db.read_connection() as conn:
             # Get user data
             cursor = conn.execute('''
                 SELECT id, email, password_hash, role, name, failed_login_attempts, 
@@ -112,25 +137,25 @@ class AuthManager:
                 if failed_attempts >= Config.MAX_LOGIN_ATTEMPTS:
                     locked_until = (datetime.now() + timedelta(milliseconds=Config.LOCKOUT_TIME)).isoformat()
                 
-                conn.execute('''
+                db.write(lambda w: w.execute('''
                     UPDATE users 
                     SET failed_login_attempts = ?, locked_until = ?
                     WHERE id = ?
-                ''', (failed_attempts, locked_until, user['id']))
-                conn.commit()
+                ''', (failed_attempts, locked_until, user['id'])))
                 
                 # Log failed attempt
                 db.log_audit(user['id'], "Failed login attempt", ip_address=ip_address)
                 
                 return False, "Invalid email or password", None
             
+            AuthManager._upgrade_hash(user['id'], password, user['password_hash'])
+            
             # Successful login - reset failed attempts and update last login
-            conn.execute('''
+            db.write(lambda w: w.execute('''
                 UPDATE users 
                 SET failed_login_attempts = 0, locked_until = NULL, last_login = CURRENT_TIMESTAMP
                 WHERE id = ?
-            ''', (user['id'],))
-            conn.commit()
+            ''', (user['id'],)))
             
             # Log successful login
             db.log_audit(user['id'], "Successful login", ip_address=ip_address)
@@ -160,28 +185,30 @@ class AuthManager:
             return False, "Invalid role"
         
         try:
-            with db.get_connection() as conn:
+            # Hash outside the write transaction - bcrypt is deliberately slow
+            password_hash = AuthManager.hash_password(password)
+            
+            def insert_user(conn):
                 # Check if user already exists
                 cursor = conn.execute('SELECT id FROM users WHERE email = ?', (email,))
                 if cursor.fetchone():
-                    return False, "User with this email already exists"
-                
-                # Hash password and create user
-                password_hash = AuthManager.hash_password(password)
+                    return None
                 
                 cursor = conn.execute('''
                     INSERT INTO users (email, password_hash, role, name)
                     VALUES (?, ?, ?, ?)
                 ''', (email, password_hash, role, name))
-                
-                user_id = cursor.lastrowid
-                conn.commit()
-                
-                # Log user creation
-                db.log_audit(created_by, f"Created user account", "users", user_id,
-                           new_values={'email': email, 'role': role, 'name': name})
-                
-                return True, "User created successfully"
+                return cursor.lastrowid
+            
+            user_id = db.write(insert_user)
+            if user_id is None:
+                return False, "User with this email already exists"
+            
+            # Log user creation
+            db.log_audit(created_by, f"Created user account", "users", user_id,
+                       new_values={'email': email, 'role': role, 'name': name})
+            
+            return True, "User created successfully"
                 
         except Exception as e:
             return False, f"Error creating user: {str(e)}"
@@ -195,7 +222,7 @@ class AuthManager:
             return False, message
         
         try:
-            with db.get_connection() as conn:
+            with db.read_connection() as conn:
                 # Get current password hash
                 cursor = conn.execute('SELECT password_hash FROM users WHERE id = ?', (user_id,))
                 user = cursor.fetchone()
@@ -209,9 +236,8 @@ class AuthManager:
                 
                 # Update password
                 new_password_hash = AuthManager.hash_password(new_password)
-                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', 
-                           (new_password_hash, user_id))
-                conn.commit()
+                db.write(lambda w: w.execute('UPDATE users SET password_hash = ? WHERE id = ?', 
+                                             (new_password_hash, user_id)))
                 
                 # Log password change
                 db.log_audit(user_id, "Password changed")
@@ -238,13 +264,15 @@ def login_required(f):
         # Check for token in session (fallback)
         elif 'access_token' in session:
             token = session['access_token']
-            print(f"DEBUG: Found token in session: {token[:20]}...")
         
-        print(f"DEBUG: Session contents: {dict(session)}")
-        print(f"DEBUG: Headers: Authorization={request.headers.get('Authorization', 'None')}")
+        # Building these costs more than the check itself, so only do it when someone is listening
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Auth for %s: token from %s, session keys %s', request.path,
+                      'header' if 'Authorization' in request.headers else 'session' if token else 'nowhere',
+                      sorted(session.keys()))
         
         if not token:
-            print("DEBUG: No authentication token found")
+            log.debug('No authentication token found')
             return jsonify({'error': 'Authentication token is missing'}), 401
         
         # Verify token
@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from metrics import record_backup
+
+log = logging.getLogger('raffle.backup')
+
+BACKUP_JOB_COLUMNS = ('id', 'status', 'backup_file', 'size_bytes', 'pages_done', 'pages_total',
+                      'error', 'requested_by', 'started_at', 'finished_at')
+
+class BackupJobs:
+    """Runs online backups on background threads and tracks them in the backup_jobs table"""
+
+    # Seconds between progress writes, so large backups do not spam the database
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, database, store):
+        self.database = database
+        self.store = store
+        self._done = {}  # job id -> Event set when a job started in this process finishes
+        self._lock = threading.Lock()
+
+    def start(self, user_id: Optional[int] = None, ip_address: str = None) -> str:
+        """Record a new job, start it in the background and return its id"""
+        job_id = uuid.uuid4().hex
+        self.database.write(lambda conn: conn.execute('''
+            INSERT INTO backup_jobs (id, status, pid, requested_by)
+            VALUES (?, 'running', ?, ?)
+        ''', (job_id, os.getpid(), user_id)))
+
+        with self._lock:
+            self._done[job_id] = threading.Event()
+        thread = threading.Thread(target=self._run, args=(job_id, user_id, ip_address),
+                                  name=f'backup-{job_id[:8]}', daemon=True)
+        thread.start()
+        return job_id
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Wait up to timeout seconds for a job started in this process, then return its status"""
+        with self._lock:
+            done = self._done.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get(job_id)
+
+    def _run(self, job_id: str, user_id: Optional[int], ip_address: str):
+        """Run a job and wake anyone waiting on it once it has finished"""
+        try:
+            self._backup(job_id, user_id, ip_address)
+        finally:
+            with self._lock:
+                done = self._done.pop(job_id, None)
+            if done is not None:
+                done.set()
+
+    def _backup(self, job_id: str, user_id: Optional[int], ip_address: str):
+        """Snapshot the database into the backup store, reporting progress as it goes"""
+        last_report = [0.0]
+
+        def progress(status, remaining, total):
+            now = time.monotonic()
+            if now - last_report[0] < self.PROGRESS_INTERVAL:
+                return
+            last_report[0] = now
+            self._update(job_id, pages_done=total - remaining, pages_total=total)
+
+        started = time.monotonic()
+        manifest = None
+        try:
+            manifest = self.store.create(progress=progress)
+            record_backup(time.monotonic() - started, 'completed', manifest)
+            self._update(job_id, status='completed', backup_file=manifest['id'],
+                         size_bytes=manifest['stored_bytes'], finished=True)
+            self.database.log_audit(
+                user_id,
+                "Database backup created",
+                notes=f"Backup {manifest['id']}: {manifest['new_chunks']} of "
+                      f"{len(manifest['chunks'])} chunks new, {manifest['stored_bytes']} bytes stored",
+                ip_address=ip_address
+            )
+            self.store.prune()
+        except Exception as e:
+            log.exception('Backup job %s failed', job_id)
+            if manifest is None:
+                record_backup(time.monotonic() - started, 'failed')
+            self._update(job_id, status='failed', error=str(e), finished=True)
+
+    def _update(self, job_id: str, finished: bool = False, **fields):
+        """Write job fields from the backup thread"""
+        assignments = [f'{name} = ?' for name in fields]
+        params = list(fields.values())
+        if finished:
+            assignments.append('finished_at = CURRENT_TIMESTAMP')
+            # A finished job always reports a full page count
+            assignments.append('pages_done = COALESCE(pages_total, pages_done)')
+
+        try:
+            self.database.write(lambda conn: conn.execute(
+                f"UPDATE backup_jobs SET {', '.join(assignments)} WHERE id = ?", params + [job_id]))
+        except Exception as e:
+            log.warning('Backup job %s status update failed (non-critical): %s', job_id, e)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a job's status, or None if it does not exist"""
+        with self.database.read_connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(BACKUP_JOB_COLUMNS)}, pid FROM backup_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+
+        # A worker that died mid-backup leaves its job running forever
+        if job['status'] == 'running' and not self._process_alive(job.pop('pid')):
+            job['status'] = 'failed'
+            job['error'] = 'Backup process exited before the backup finished'
+            self.database.write(lambda conn: conn.execute('''
+                UPDATE backup_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            ''', (job['status'], job['error'], job_id)))
+
+        job.pop('pid', None)
+        return job
+
+    @staticmethod
+    def _process_alive(pid: Optional[int]) -> bool:
+        """Check whether the worker that owns a job still exists"""
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
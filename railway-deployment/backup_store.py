@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Tuple
+from config import Config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows development: only the in-process lock and the grace period below apply
+    fcntl = None
+
+# Chunks younger than this are never garbage collected - a second line of defence
+# where the cross-process store lock is unavailable
+CHUNK_GC_GRACE_SECONDS = 3600
+
+class BackupStore:
+    """Content-addressed backup store: compressed, deduplicated chunks plus one manifest per backup"""
+
+    def __init__(self, database, store_path: str = None, chunk_size: int = None):
+        self.database = database
+        self.store_path = store_path or Config.BACKUP_PATH
+        self.chunk_size = chunk_size or Config.BACKUP_CHUNK_SIZE
+        self.chunks_path = os.path.join(self.store_path, 'chunks')
+        self.manifests_path = os.path.join(self.store_path, 'manifests')
+        self.lock_path = os.path.join(self.store_path, 'store.lock')
+        self._lock = threading.Lock()
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.manifests_path, exist_ok=True)
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_path, digest[:2], digest)
+
+    def _manifest_path(self, backup_id: str) -> str:
+        return os.path.join(self.manifests_path, f'{backup_id}.json')
+
+    @contextmanager
+    def _store_lock(self, exclusive: bool = False):
+        """Lock the store across processes: shared while chunks are written or read, exclusive to prune"""
+        # Every gunicorn worker and manage.py command opens its own BackupStore, so an
+        # in-process lock alone cannot stop prune deleting a chunk another process just reused
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """Write to a unique temp file, fsync and rename into place"""
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _snapshot_in_memory(self) -> Tuple[memoryview, int]:
+        """Copy the live database into memory; returns the file image and its page size"""
+        memory = sqlite3.connect(':memory:')
+        try:
+            self.database.backup_to(memory)
+            page_size = memory.execute('PRAGMA page_size').fetchone()[0]
+            image = memory.serialize()
+        finally:
+            # Closed straight away, so the in-memory database and its serialized copy
+            # only coexist for the length of serialize()
+            memory.close()
+        return memoryview(image), page_size
+
+    def create(self, progress=None) -> Dict:
+        """Snapshot the live database and store only the chunks not already in the store.
+        
+        Databases up to BACKUP_MEMORY_MAX are copied into memory and chunked from there, so a
+        backup reads the database once and writes only its new chunks. Larger ones go through a
+        temporary snapshot file, which costs a full extra write and read of the database.
+        progress(status, remaining, total) is called with pages still to chunk.
+        """
+        backup_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        snapshot = None
+
+        try:
+            with self.database.read_connection() as conn:
+                estimated_size = (conn.execute('PRAGMA page_count').fetchone()[0] *
+                                  conn.execute('PRAGMA page_size').fetchone()[0])
+
+            if estimated_size <= Config.BACKUP_MEMORY_MAX:
+                image, page_size = self._snapshot_in_memory()
+                size = len(image)
+            else:
+                snapshot = os.path.join(self.store_path, f'snapshot_{backup_id}.db')
+                self.database.backup_database(backup_file=snapshot)
+                with sqlite3.connect(snapshot) as conn:
+                    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+                size = os.path.getsize(snapshot)
+
+            # Chunks are page aligned so an unchanged page range always hashes the same
+            chunk_size = max(self.chunk_size // page_size, 1) * page_size
+            file_hash = hashlib.sha256()
+            chunks = []
+            new_chunks = 0
+            stored_bytes = 0
+            total_pages = size // page_size
+
+            with self._store_lock(), (open(snapshot, 'rb') if snapshot else nullcontext()) as f:
+                for offset in range(0, size, chunk_size):
+                    data = f.read(chunk_size) if snapshot else image[offset:offset + chunk_size]
+                    if offset == 0 and not snapshot:
+                        # The header still carries the WAL file format (bytes 18-19); mark it as a
+                        # rollback-journal database, as PRAGMA journal_mode=DELETE does for snapshot
+                        # files, so a restore stands alone. Patching this first chunk avoids copying
+                        # the whole image into a mutable buffer
+                        data = bytes(data[:18]) + b'\x01\x01' + bytes(data[20:])
+                    if progress is not None:
+                        progress(0, total_pages - (offset + len(data)) // page_size, total_pages)
+                    file_hash.update(data)
+                    digest = hashlib.sha256(data).hexdigest()
+                    chunks.append(digest)
+
+                    path = self._chunk_path(digest)
+                    if os.path.exists(path):
+                        # Refresh the mtime so garbage collection sees the chunk as in use
+                        os.utime(path)
+                        continue
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    compressed = zlib.compress(data, 6)
+                    self._write_atomic(path, compressed)
+                    new_chunks += 1
+                    stored_bytes += len(compressed)
+
+                # Written under the same lock, so prune sees either no chunks of this
+                # backup in use yet or the manifest that references them
+                manifest = {
+                    'id': backup_id,
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'size': size,
+                    'page_size': page_size,
+                    'chunk_size': chunk_size,
+                    'sha256': file_hash.hexdigest(),
+                    'chunks': chunks,
+                    'new_chunks': new_chunks,
+                    'stored_bytes': stored_bytes
+                }
+                self._write_atomic(self._manifest_path(backup_id), json.dumps(manifest).encode('utf-8'))
+            return manifest
+        finally:
+            if snapshot and os.path.exists(snapshot):
+                os.remove(snapshot)
+
+    def list_backups(self) -> List[Dict]:
+        """Return every manifest, newest first"""
+        manifests = []
+        for filename in os.listdir(self.manifests_path):
+            if filename.endswith('.json'):
+                manifests.append(self.load_manifest(filename[:-len('.json')]))
+        manifests.sort(key=lambda m: m['id'], reverse=True)
+        return manifests
+
+    def load_manifest(self, backup_id: str) -> Dict:
+        """Read one backup's manifest"""
+        with open(self._manifest_path(backup_id), 'rb') as f:
+            return json.loads(f.read())
+
+    def _read_chunk(self, digest: str) -> bytes:
+        """Decompress a chunk and check it against its content hash"""
+        with open(self._chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f'Chunk {digest} is corrupt')
+        return data
+
+    def verify(self, backup_id: str = None) -> Dict[str, List[str]]:
+        """Check every chunk of one or all backups; returns problems per backup id"""
+        with self._store_lock():
+            return self._verify(backup_id)
+
+    def _verify(self, backup_id: str = None) -> Dict[str, List[str]]:
+        manifests = [self.load_manifest(backup_id)] if backup_id else self.list_backups()
+        problems = {}
+
+        for manifest in manifests:
+            errors = []
+            file_hash = hashlib.sha256()
+            size = 0
+            for digest in manifest['chunks']:
+                try:
+                    data = self._read_chunk(digest)
+                except FileNotFoundError:
+                    errors.append(f'Missing chunk {digest}')
+                    continue
+                except (ValueError, zlib.error) as e:
+                    errors.append(str(e))
+                    continue
+                file_hash.update(data)
+                size += len(data)
+
+            if not errors:
+                if size != manifest['size']:
+                    errors.append(f"Size mismatch: {size} != {manifest['size']}")
+                elif file_hash.hexdigest() != manifest['sha256']:
+                    errors.append('Database checksum mismatch')
+            problems[manifest['id']] = errors
+
+        return problems
+
+    def restore(self, backup_id: str, target_path: str) -> Dict:
+        """Rebuild a backup's database file at target_path"""
+        tmp_path = f'{target_path}.restore.tmp'
+        file_hash = hashlib.sha256()
+
+        try:
+            with self._store_lock(), open(tmp_path, 'wb') as f:
+                manifest = self.load_manifest(backup_id)
+                for digest in manifest['chunks']:
+                    data = self._read_chunk(digest)
+                    file_hash.update(data)
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            if file_hash.hexdigest() != manifest['sha256']:
+                raise ValueError(f'Restored database for {backup_id} does not match its checksum')
+
+            # The restored data version is older than the live one, so give it a new epoch
+            # or clients could revalidate against versions the old database already used
+            conn = sqlite3.connect(tmp_path)
+            try:
+                with conn:
+                    self.database.renew_data_epoch(conn)
+            finally:
+                conn.close()
+
+            # A leftover WAL from the old database would be replayed over the restored one
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(target_path + suffix):
+                    os.remove(target_path + suffix)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return manifest
+
+    def select_retained(self, manifests: List[Dict], hourly: int, daily: int, weekly: int) -> set:
+        """Pick backups to keep: the newest overall plus the newest in each recent hour, day and week"""
+        keep = set()
+        if manifests:
+            keep.add(manifests[0]['id'])
+
+        for bucket_format, count in (('%Y-%m-%d %H', hourly), ('%Y-%m-%d', daily), ('%G-W%V', weekly)):
+            seen = set()
+            for manifest in manifests:
+                if len(seen) >= count:
+                    break
+                bucket = datetime.fromisoformat(manifest['created_at']).strftime(bucket_format)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(manifest['id'])
+        return keep
+
+    def prune(self, hourly: int = None, daily: int = None, weekly: int = None) -> Dict:
+        """Apply the retention policy, then delete chunks no remaining backup uses"""
+        hourly = hourly if hourly is not None else Config.BACKUP_KEEP_HOURLY
+        daily = daily if daily is not None else Config.BACKUP_KEEP_DAILY
+        weekly = weekly if weekly is not None else Config.BACKUP_KEEP_WEEKLY
+
+        with self._lock, self._store_lock(exclusive=True):
+            manifests = self.list_backups()
+            keep = self.select_retained(manifests, hourly, daily, weekly)
+
+            removed_backups = 0
+            for manifest in manifests:
+                if manifest['id'] not in keep:
+                    os.remove(self._manifest_path(manifest['id']))
+                    removed_backups += 1
+
+            referenced = set()
+            for manifest in manifests:
+                if manifest['id'] in keep:
+                    referenced.update(manifest['chunks'])
+
+            removed_chunks = 0
+            freed_bytes = 0
+            cutoff = time.time() - CHUNK_GC_GRACE_SECONDS
+            for prefix in os.listdir(self.chunks_path):
+                prefix_path = os.path.join(self.chunks_path, prefix)
+                for digest in os.listdir(prefix_path):
+                    path = os.path.join(prefix_path, digest)
+                    if digest in referenced or digest.endswith('.tmp'):
+                        continue
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                    removed_chunks += 1
+                    freed_bytes += stat.st_size
+
+        return {
+            'kept_backups': len(keep),
+            'removed_backups': removed_backups,
+            'removed_chunks': removed_chunks,
+            'freed_bytes': freed_bytes
+        }
+
+    def usage(self) -> Dict:
+        """Report how much disk the store uses against the logical size of its backups"""
+        stored_bytes = 0
+        for prefix in os.listdir(self.chunks_path):
+            prefix_path = os.path.join(self.chunks_path, prefix)
+            for digest in os.listdir(prefix_path):
+                stored_bytes += os.path.getsize(os.path.join(prefix_path, digest))
+        manifests = self.list_backups()
+        return {
+            'backups': len(manifests),
+            'logical_bytes': sum(m['size'] for m in manifests),
+            'stored_bytes': stored_bytes
+        }
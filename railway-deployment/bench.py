@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Flask API against synthetic databases of several sizes
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Employees, activities and audit rows in each synthetic database
+SCALES = {
+    'small': (100, 2_000, 2_000),
+    'medium': (10_000, 500_000, 100_000),
+    'large': (100_000, 10_000_000, 1_000_000),
+}
+
+# Seeded history ends here rather than today, so a seed builds the same database on any day
+DATA_END_DATE = '2025-12-31'
+
+# Timed requests per app as (name, method, path, JSON body); {employee_id} is filled in per request.
+# Reads run before writes so the write scenarios do not invalidate the read caches mid-run.
+SCENARIOS = {
+    'app': [
+        ('employees_page', 'GET', '/api/employees?limit=50', None),
+        ('employees_all', 'GET', '/api/employees', None),
+        ('add_entry', 'POST', '/api/employee/{employee_id}/add_entry',
+         {'activity_name': 'Benchmark', 'entries_awarded': 1}),
+    ],
+    'app_complex': [
+        ('employees_page', 'GET', '/api/employees?limit=50', None),
+        ('employees_all', 'GET', '/api/employees', None),
+        ('analytics_dashboard', 'GET', '/api/analytics/dashboard', None),
+        ('analytics_trends', 'GET', '/api/analytics/trends?grain=month&start=2025-01-01&end=2025-12-31', None),
+        ('audit', 'GET', '/api/audit?limit=100', None),
+        ('raffle_conduct', 'POST', '/api/raffle/conduct', {}),
+        ('add_entry', 'POST', '/api/employee/{employee_id}/add_entry',
+         {'activity_name': 'Benchmark', 'activity_category': 'manual', 'entries_awarded': 1}),
+    ],
+}
+
+def build_database(scale, seed):
+    """Fill DATABASE_PATH with a scale's synthetic data"""
+    from database import db
+    from seed import Seeder
+
+    employees, activities, audit_rows = SCALES[scale]
+    Seeder(db, seed=seed, end_date=DATA_END_DATE).seed_database(employees, activities, audit_rows=audit_rows)
+    with db.get_connection() as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def run_worker(args):
+    """Time each scenario of one app in this process; the database comes from DATABASE_PATH"""
+    import importlib
+    module = importlib.import_module(args.worker)
+    module.limiter.enabled = False
+    client = module.app.test_client()
+    client.set_cookie('auth', 'Homeinstead3042')
+
+    rng = random.Random(args.seed)
+    with sqlite3.connect(os.environ['DATABASE_PATH']) as conn:
+        # Requests for inactive employees would 404, so only pick active ones
+        employee_ids = [row[0] for row in conn.execute('SELECT id FROM employees WHERE is_active = 1')] or [1]
+
+    results = []
+    for name, method, path, body in SCENARIOS[args.worker]:
+        def send():
+            url = path.format(employee_id=rng.choice(employee_ids))
+            return client.open(url, method=method, json=body)
+
+        for _ in range(args.warmup):
+            send()
+
+        timings, errors = [], 0
+        started = time.perf_counter()
+        while len(timings) < args.requests and time.perf_counter() - started < args.max_seconds:
+            request_started = time.perf_counter()
+            response = send()
+            timings.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        results.append({
+            'endpoint': name,
+            'method': method,
+            'path': path,
+            'requests': len(timings),
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'throughput_rps': round(len(timings) / elapsed, 1)
+        })
+
+    with open(args.result_file, 'w') as f:
+        json.dump(results, f)
+    return True
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_database(scale, seed, data_dir):
+    """Build a scale's database once and reuse it while the seed is unchanged"""
+    employees, activities, audit_rows = SCALES[scale]
+    path = os.path.join(data_dir, f'{scale}_seed{seed}.db')
+    if not os.path.exists(path):
+        print(f"Building {scale} database: {employees} employees, {activities} activities, "
+              f"{audit_rows} audit rows...")
+        started = time.perf_counter()
+        # In its own process, since the database module opens DATABASE_PATH at import time
+        building = path + '.building'
+        for leftover in (building, building + '-wal', building + '-shm'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        # Bulk inserts are slow by design, so keep them out of the slow-query log
+        env = dict(os.environ, DATABASE_PATH=building, BACKUP_PATH=os.path.join(data_dir, 'backups'),
+                   SLOW_QUERY_MS='3600000')
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--build', scale, '--seed', str(seed)],
+                       env=env, check=True, stdout=subprocess.DEVNULL)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(building + suffix):
+                os.remove(building + suffix)
+        os.replace(building, path)
+        print(f"  built in {time.perf_counter() - started:.1f}s")
+    return path
+
+def run_benchmarks(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'settings': {'requests': args.requests, 'max_seconds': args.max_seconds,
+                     'warmup': args.warmup, 'seed': args.seed},
+        'results': []
+    }
+
+    for scale in args.scales:
+        source = prepare_database(scale, args.seed, args.data_dir)
+        employees, activities, _ = SCALES[scale]
+        for app_name in args.apps:
+            # Each run gets a fresh copy of the database and a fresh process, since the apps
+            # open their database at import time and the write scenarios change it
+            with tempfile.TemporaryDirectory(prefix='raffle_bench_') as workdir:
+                db_path = os.path.join(workdir, 'raffle.db')
+                shutil.copyfile(source, db_path)
+                result_file = os.path.join(workdir, 'result.json')
+                env = dict(os.environ, DATABASE_PATH=db_path, BACKUP_PATH=os.path.join(workdir, 'backups'),
+                           UPLOAD_PATH=os.path.join(workdir, 'uploads'),
+                           CACHE_PATH=os.path.join(workdir, 'result_cache.db'),
+                           AUDIT_ARCHIVE_PATH=os.path.join(workdir, 'audit_archive'),
+                           LOG_LEVEL=os.getenv('LOG_LEVEL', 'ERROR'))
+                command = [sys.executable, os.path.abspath(__file__), '--worker', app_name,
+                           '--result-file', result_file, '--requests', str(args.requests),
+                           '--max-seconds', str(args.max_seconds), '--warmup', str(args.warmup),
+                           '--seed', str(args.seed)]
+                subprocess.run(command, cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+                with open(result_file) as f:
+                    rows = json.load(f)
+
+            for row in rows:
+                row.update({'scale': scale, 'employees': employees, 'activities': activities, 'app': app_name})
+                report['results'].append(row)
+                print(f"{scale:>6} {app_name:<11} {row['endpoint']:<20} {row['requests']:>5} req "
+                      f"p50 {row['p50_ms']:>9.2f}ms  p95 {row['p95_ms']:>9.2f}ms  p99 {row['p99_ms']:>9.2f}ms  "
+                      f"{row['throughput_rps']:>8.1f} req/s  {row['errors']} errors")
+
+    output = args.output or os.path.join(
+        HERE, 'bench_results', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {output}")
+
+    if args.compare:
+        return compare(args.compare, report, args.threshold)
+    return True
+
+def compare(baseline_file, report, threshold):
+    """Print p95 changes against an earlier run; False when any endpoint regressed past the threshold"""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    previous = {(r['scale'], r['app'], r['endpoint']): r for r in baseline['results']}
+
+    ok = True
+    print(f"\nCompared with {baseline_file} (commit {baseline.get('commit')}):")
+    for row in report['results']:
+        before = previous.get((row['scale'], row['app'], row['endpoint']))
+        if before is None or not before['p95_ms']:
+            continue
+        change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        regressed = change > threshold
+        ok = ok and not regressed
+        print(f"{'❌' if regressed else '✓'} {row['scale']:>6} {row['app']:<11} {row['endpoint']:<20} "
+              f"p95 {before['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms ({change:+.1f}%)")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--scales', default='small,medium',
+                        help=f"Comma-separated scales from {', '.join(SCALES)} (default: small,medium)")
+    parser.add_argument('--apps', default='app,app_complex', help='Comma-separated apps (default: both)')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+    parser.add_argument('--max-seconds', type=float, default=20.0, help='Time limit per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data and request ids')
+    parser.add_argument('--data-dir', default=os.path.join(HERE, 'bench_data'),
+                        help='Where built databases are kept for reuse')
+    parser.add_argument('--output', default=None, help='Results file (default: bench_results/<time>_<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare p95 against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='p95 increase in percent counted as a regression')
+    parser.add_argument('--build', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.build:
+        build_database(args.build, args.seed)
+        return True
+    if args.worker:
+        return run_worker(args)
+
+    args.scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    args.apps = [a.strip() for a in args.apps.split(',') if a.strip()]
+    unknown = [s for s in args.scales if s not in SCALES] + [a for a in args.apps if a not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scale or app: {', '.join(unknown)}")
+    return run_benchmarks(args)
+
+if __name__ == "__main__":
+    sys.path.insert(0, HERE)
+    if not main():
+        sys.exit(1)
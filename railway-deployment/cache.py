@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+from config import Config
+
+log = logging.getLogger('raffle.cache')
+
+class ResultCache:
+    """Query result cache shared by all gunicorn workers through a local SQLite file"""
+
+    def __init__(self, cache_path: str = None, ttl: int = None, max_entries: int = None):
+        self.cache_path = cache_path or Config.CACHE_PATH
+        self.ttl = ttl if ttl is not None else Config.CACHE_TTL_SECONDS
+        self.max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_path != ':memory:':
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache(expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection to the cache file"""
+        if not hasattr(self._local, 'connection'):
+            conn = sqlite3.connect(self.cache_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Cache contents are disposable, so skip fsyncs entirely
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.connection = conn
+        return self._local.connection
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        """Return the cached value if it was computed for this data version and has not expired"""
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM result_cache WHERE key = ? AND version = ? AND expires_at > ?',
+                (key, version, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning('Cache read failed (non-critical): %s', e)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, version: int, value: Any):
+        """Store a value for this data version, evicting expired and then oldest entries"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, version, value, expires_at) VALUES (?, ?, ?, ?)',
+                (key, version, json.dumps(value), now + self.ttl)
+            )
+            conn.execute('DELETE FROM result_cache WHERE expires_at <= ?', (now,))
+            conn.execute('''
+                DELETE FROM result_cache WHERE key IN (
+                    SELECT key FROM result_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+        except sqlite3.Error as e:
+            log.warning('Cache write failed (non-critical): %s', e)
+
+    def get_or_compute(self, key: str, version: int, compute: Callable[[], Any]) -> Any:
+        """Return the cached value or compute, store and return it"""
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.set(key, version, value)
+        return value
+
+    def clear(self):
+        """Drop every cached entry"""
+        self._connection().execute('DELETE FROM result_cache')
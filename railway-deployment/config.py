@@ -15,6 +15,60 @@ class Config:
     # Database
     DATABASE_PATH = os.getenv('DATABASE_PATH', './data/raffle_database.db')
     BACKUP_PATH = os.getenv('BACKUP_PATH', './backups')
+    BACKUP_CHUNK_SIZE = int(os.getenv('BACKUP_CHUNK_SIZE', 65536))  # Bytes per deduplicated backup chunk
+    BACKUP_MEMORY_MAX = int(os.getenv('BACKUP_MEMORY_MAX', 67108864))  # Larger databases snapshot through a temp file
+    BACKUP_KEEP_HOURLY = int(os.getenv('BACKUP_KEEP_HOURLY', 24))  # Hourly backups kept by retention
+    BACKUP_KEEP_DAILY = int(os.getenv('BACKUP_KEEP_DAILY', 7))  # Daily backups kept by retention
+    BACKUP_KEEP_WEEKLY = int(os.getenv('BACKUP_KEEP_WEEKLY', 4))  # Weekly backups kept by retention
+    RESET_BACKUP_TIMEOUT = float(os.getenv('RESET_BACKUP_TIMEOUT', 60))  # Seconds a full reset waits for its backup
+    
+    # Connection pool (per worker process)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))  # Most connections open at once
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10.0))  # Seconds to wait for a free connection
+    DB_POOL_IDLE_SECONDS = int(os.getenv('DB_POOL_IDLE_SECONDS', 300))  # Idle connections older than this are closed
+    DB_POOL_MIN_IDLE = int(os.getenv('DB_POOL_MIN_IDLE', 1))  # Idle connections kept open regardless
+    DB_POOL_HEALTH_CHECK_SECONDS = int(os.getenv('DB_POOL_HEALTH_CHECK_SECONDS', 30))  # Ping before reusing after this long idle
+    
+    # Single writer per process
+    WRITE_BUSY_TIMEOUT = int(os.getenv('WRITE_BUSY_TIMEOUT', 250))  # Milliseconds SQLite waits before we back off
+    WRITE_MAX_RETRIES = int(os.getenv('WRITE_MAX_RETRIES', 8))  # Busy retries before a write fails
+    WRITE_BACKOFF_BASE = float(os.getenv('WRITE_BACKOFF_BASE', 0.01))  # Seconds, doubled per retry
+    WRITE_BACKOFF_MAX = float(os.getenv('WRITE_BACKOFF_MAX', 0.5))  # Longest single backoff in seconds
+    WRITE_GROUP_COMMIT = os.getenv('WRITE_GROUP_COMMIT', 'true').lower() == 'true'  # Share one COMMIT between queued writes
+    WRITE_GROUP_WINDOW = float(os.getenv('WRITE_GROUP_WINDOW', 0.002))  # Seconds to wait for more writes to join a group
+    WRITE_GROUP_MAX = int(os.getenv('WRITE_GROUP_MAX', 64))  # Most writes committed together
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))  # Statements slower than this are logged with their plan
+    
+    # PRAGMAs applied once to every new connection
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # Safe with WAL, skips an fsync per commit
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -16000))  # Negative means KiB, so ~16MB
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 134217728))  # 128MB of memory-mapped reads
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # Milliseconds
+    SQLITE_PRAGMAS = {
+        'synchronous': SQLITE_SYNCHRONOUS,
+        'cache_size': SQLITE_CACHE_SIZE,
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'temp_store': SQLITE_TEMP_STORE,
+        'busy_timeout': SQLITE_BUSY_TIMEOUT
+    }
+    
+    # Result cache shared by all workers (lives next to the database by default)
+    CACHE_PATH = os.getenv('CACHE_PATH', os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'result_cache.db'))
+    CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 300))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 256))
+    
+    # Audit log writer
+    AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'true').lower() == 'true'  # Batch audit writes off the request path
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 100))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0))  # Seconds
+    AUDIT_QUEUE_MAX = int(os.getenv('AUDIT_QUEUE_MAX', 10000))
+    
+    # Audit archival into compressed cold segments
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 90))  # Older rows move to the archive
+    AUDIT_ARCHIVE_INTERVAL = int(os.getenv('AUDIT_ARCHIVE_INTERVAL', 86400))  # Seconds between automatic archive runs; 0 disables
+    AUDIT_ARCHIVE_PATH = os.getenv('AUDIT_ARCHIVE_PATH', os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'audit_archive'))
+    AUDIT_SEGMENT_MAX_ROWS = int(os.getenv('AUDIT_SEGMENT_MAX_ROWS', 50000))
     
     # Application
     APP_NAME = os.getenv('APP_NAME', 'Home Instead Raffle Dashboard')
@@ -25,10 +79,46 @@ class Config:
     UPLOAD_PATH = os.getenv('UPLOAD_PATH', './uploads')
     ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'png', 'jpg', 'jpeg', 'gif'}
     
+    # API
+    EMPLOYEE_PAGE_MAX = int(os.getenv('EMPLOYEE_PAGE_MAX', 500))  # Largest ?limit= for /api/employees
+    
+    # Monitoring
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # When set, /metrics requires "Authorization: Bearer <token>"
+    
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # DEBUG turns on the per-request and per-row detail
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_MAX = int(os.getenv('LOG_QUEUE_MAX', 10000))  # Records buffered before new ones are dropped
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')  # e.g. "raffle.import=0.01" keeps 1% of its debug/info
+    
+    # Rate limiting, read by Flask-Limiter; counters are shared by all workers through a local SQLite file
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'  # Load tests turn it off
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'sqlite:///' + os.path.join(os.path.dirname(DATABASE_PATH) or '.', 'rate_limits.db'))
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter')  # Or fixed-window
+    RATELIMIT_PURGE_INTERVAL = float(os.getenv('RATELIMIT_PURGE_INTERVAL', 30.0))  # Seconds between sweeps of expired keys
+    RATELIMIT_PURGE_BATCH = int(os.getenv('RATELIMIT_PURGE_BATCH', 1000))  # Most expired keys deleted per sweep
+    
+    # Live updates (Server-Sent Events)
+    EVENT_POLL_INTERVAL = float(os.getenv('EVENT_POLL_INTERVAL', 1.0))  # Seconds between change_events polls
+    EVENT_HEARTBEAT_SECONDS = int(os.getenv('EVENT_HEARTBEAT_SECONDS', 15))
+    EVENT_STREAM_MAX_SECONDS = int(os.getenv('EVENT_STREAM_MAX_SECONDS', 300))  # Client reconnects after this
+    WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 4))  # Request threads per worker, set by gunicorn.conf.py
+    EVENT_RESERVED_THREADS = int(os.getenv('EVENT_RESERVED_THREADS', 2))  # Threads per worker kept free of streams
+    EVENT_MAX_STREAMS = int(os.getenv('EVENT_MAX_STREAMS', max(WORKER_THREADS - EVENT_RESERVED_THREADS, 0)))  # Open streams per worker; each holds a thread
+    EVENT_STREAM_RETRY_SECONDS = int(os.getenv('EVENT_STREAM_RETRY_SECONDS', 30))  # Retry-After when streams are full
+    EVENT_RETENTION_SECONDS = int(os.getenv('EVENT_RETENTION_SECONDS', 3600))  # 1 hour of replayable events
+    
     # Security Settings
     SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', 3600000))  # 1 hour
     MAX_LOGIN_ATTEMPTS = int(os.getenv('MAX_LOGIN_ATTEMPTS', 5))
     LOCKOUT_TIME = int(os.getenv('LOCKOUT_TIME', 900000))  # 15 minutes
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))  # Verified tokens kept per worker; 0 disables
+    
+    # Password hashing (per worker process)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))  # Work factor; older hashes are upgraded at login
+    BCRYPT_THREADS = int(os.getenv('BCRYPT_THREADS', 2))  # Hashes running at once
+    BCRYPT_QUEUE_MAX = int(os.getenv('BCRYPT_QUEUE_MAX', 4))  # Hashes waiting before new ones are refused
+    BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', 5.0))  # Seconds a login waits for its hash
     
     # Email Configuration
     MAIL_SERVER = os.getenv('SMTP_HOST', 'smtp.gmail.com')
@@ -1,12 +1,22 @@
 import sqlite3
 import json
 import os
+import secrets
 import shutil
 from datetime import datetime
-from contextlib import contextmanager
 from typing import Dict, List, Optional, Any
-import threading
 from config import Config
+from audit import AuditWriter
+from pool import ConnectionPool
+from writer import WriteQueue
+
+# Time buckets maintained in activity_rollups, as SQLite date expressions over {ts}
+ROLLUP_GRAINS = {
+    'day': "date({ts})",
+    'week': "date({ts}, 'weekday 0', '-6 days')",
+    'month': "date({ts}, 'start of month')",
+    'quarter': "date({ts}, 'start of month', '-' || ((CAST(strftime('%m', {ts}) AS INTEGER) - 1) % 3) || ' months')",
+}
 
 class DatabaseManager:
     """Thread-safe SQLite database manager for the raffle system"""
@@ -14,7 +24,10 @@ class DatabaseManager:
     def __init__(self, db_path: str = None):
         self.db_path = db_path or Config.DATABASE_PATH
         self.backup_path = Config.BACKUP_PATH
-        self._local = threading.local()
+        self.pool = ConnectionPool(self.db_path)
+        self.read_pool = ConnectionPool(self.db_path, read_only=True)
+        self.writer = WriteQueue(self.db_path)
+        self.audit_writer = AuditWriter(self.writer)
         
         # Ensure directories exist
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -23,26 +36,25 @@ class DatabaseManager:
         # Initialize database
         self.init_database()
     
-    @contextmanager
     def get_connection(self):
-        """Get a database connection with proper error handling"""
-        if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(
-                self.db_path,
-                check_same_thread=False,
-                timeout=30.0
-            )
-            self._local.connection.row_factory = sqlite3.Row
-            
-            # Enable WAL mode for better concurrent access
-            self._local.connection.execute('PRAGMA journal_mode=WAL')
-            self._local.connection.execute('PRAGMA foreign_keys=ON')
-            
-        try:
-            yield self._local.connection
-        except Exception as e:
-            self._local.connection.rollback()
-            raise e
+        """Check out a pooled read-write connection (schema setup and maintenance commands)"""
+        return self.pool.connection()
+    
+    def read_connection(self):
+        """Check out a pooled read-only connection; never waits on writers"""
+        return self.read_pool.connection()
+    
+    def write(self, fn, *args, **kwargs):
+        """Run fn(conn, *args, **kwargs) in one transaction on this process's writer and return its result"""
+        return self.writer.execute(fn, *args, **kwargs)
+    
+    def connection_stats(self) -> Dict:
+        """Pool and writer statistics for monitoring"""
+        return {
+            'read_pool': self.read_pool.stats(),
+            'pool': self.pool.stats(),
+            'writer': self.writer.stats()
+        }
     
     def init_database(self):
         """Initialize the database with all required tables"""
@@ -139,19 +151,230 @@ class DatabaseManager:
                 )
             ''')
             
+            # Index over archived audit segments: id and time range plus the users they contain
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_segments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT UNIQUE NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    min_id INTEGER NOT NULL,
+                    max_id INTEGER NOT NULL,
+                    min_created_at TIMESTAMP NOT NULL,
+                    max_created_at TIMESTAMP NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_segment_users (
+                    user_id INTEGER NOT NULL,
+                    segment_id INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, segment_id)
+                ) WITHOUT ROWID
+            ''')
+            
+            # Background backup jobs, visible to every worker
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS backup_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    backup_file TEXT,
+                    size_bytes INTEGER,
+                    pages_done INTEGER DEFAULT 0,
+                    pages_total INTEGER,
+                    error TEXT,
+                    pid INTEGER,
+                    requested_by INTEGER,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+            
+            # Change events tailed by every worker for live updates
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS change_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
             # Create indexes for performance
             conn.execute('CREATE INDEX IF NOT EXISTS idx_employees_name ON employees(name)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_employees_department ON employees(department)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_employees_entries ON employees(total_entries)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_employee ON activities(employee_id)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_date ON activities(created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_employee_date ON activities(employee_id, created_at)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_log(user_id)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_date ON audit_log(created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_segments_time ON audit_segments(max_created_at, min_created_at)')
+
+            # Data version stamp - bumped by triggers on every employee or activity
+            # write so caches and ETags can be validated with a single primary-key read
+            conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('data_version', '0')")
+            # The version restarts when the file is recreated or restored, so validators also
+            # carry a random epoch that names this particular run of versions
+            conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('data_epoch', ?)",
+                         (secrets.token_hex(4),))
+            for table in ('employees', 'activities'):
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    conn.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE settings SET value = CAST(value AS INTEGER) + 1
+                            WHERE key = 'data_version';
+                        END
+                    ''')
+
+            # Department aggregates kept current by triggers on employees
+            needs_backfill = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'department_stats'"
+            ).fetchone() is None
+            self._create_department_stats(conn)
+            if needs_backfill:
+                self.rebuild_department_stats(conn)
+            
+            # Time-bucketed activity rollups kept current by triggers on activities
+            needs_backfill = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'activity_rollups'"
+            ).fetchone() is None
+            self._create_activity_rollups(conn)
+            if needs_backfill:
+                self.rebuild_activity_rollups(conn)
             
             # Create default admin user if none exists
             self._create_default_admin(conn)
             
             conn.commit()
     
+    def _create_department_stats(self, conn):
+        """Create the department_stats summary table and the triggers that maintain it"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS department_stats (
+                department TEXT PRIMARY KEY,
+                employee_count INTEGER NOT NULL DEFAULT 0,
+                total_entries INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Add a row's contribution when it becomes an active employee with a department
+        add_new = '''
+            INSERT INTO department_stats (department, employee_count, total_entries)
+            SELECT NEW.department, 1, COALESCE(NEW.total_entries, 0)
+            WHERE NEW.is_active = 1 AND NEW.department IS NOT NULL
+            ON CONFLICT(department) DO UPDATE SET
+                employee_count = employee_count + 1,
+                total_entries = total_entries + excluded.total_entries;
+        '''
+        # Remove the contribution of the previous version of a row
+        remove_old = '''
+            UPDATE department_stats
+            SET employee_count = employee_count - 1,
+                total_entries = total_entries - COALESCE(OLD.total_entries, 0)
+            WHERE department = OLD.department AND OLD.is_active = 1;
+            DELETE FROM department_stats
+            WHERE department = OLD.department AND employee_count <= 0;
+        '''
+        
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_department_stats_insert
+            AFTER INSERT ON employees
+            BEGIN
+                {add_new}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_department_stats_update
+            AFTER UPDATE OF department, total_entries, is_active ON employees
+            BEGIN
+                {remove_old}
+                {add_new}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_department_stats_delete
+            AFTER DELETE ON employees
+            BEGIN
+                {remove_old}
+            END
+        ''')
+    
+    def rebuild_department_stats(self, conn=None) -> int:
+        """Recompute department_stats from scratch (backfill or repair)"""
+        if conn is None:
+            with self.get_connection() as conn:
+                count = self.rebuild_department_stats(conn)
+                conn.commit()
+                return count
+        
+        conn.execute('DELETE FROM department_stats')
+        cursor = conn.execute('''
+            INSERT INTO department_stats (department, employee_count, total_entries)
+            SELECT department, COUNT(*), COALESCE(SUM(total_entries), 0)
+            FROM employees
+            WHERE is_active = 1 AND department IS NOT NULL
+            GROUP BY department
+        ''')
+        return cursor.rowcount
+    
+    def _create_activity_rollups(self, conn):
+        """Create the activity_rollups table and the triggers that maintain it"""
+        # Department is '' rather than NULL so it can take part in the primary key
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS activity_rollups (
+                grain TEXT NOT NULL,
+                bucket_start DATE NOT NULL,
+                department TEXT NOT NULL DEFAULT '',
+                category TEXT NOT NULL,
+                activity_count INTEGER NOT NULL DEFAULT 0,
+                entries_awarded INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (grain, bucket_start, department, category)
+            ) WITHOUT ROWID
+        ''')
+        
+        department = "COALESCE((SELECT department FROM employees WHERE id = {row}.employee_id), '')"
+        for event, row, sign in (('INSERT', 'NEW', 1), ('DELETE', 'OLD', -1)):
+            statements = ''.join(f'''
+                INSERT INTO activity_rollups (grain, bucket_start, department, category, activity_count, entries_awarded)
+                VALUES ('{grain}', {expr.format(ts=row + '.created_at')}, {department.format(row=row)},
+                        {row}.activity_category, {sign}, {sign} * {row}.entries_awarded)
+                ON CONFLICT(grain, bucket_start, department, category) DO UPDATE SET
+                    activity_count = activity_count + excluded.activity_count,
+                    entries_awarded = entries_awarded + excluded.entries_awarded;
+            ''' for grain, expr in ROLLUP_GRAINS.items())
+            
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_activity_rollups_{event.lower()}
+                AFTER {event} ON activities
+                BEGIN
+                    {statements}
+                END
+            ''')
+    
+    def rebuild_activity_rollups(self, conn=None) -> int:
+        """Recompute activity_rollups from the activities table (backfill or repair)"""
+        if conn is None:
+            with self.get_connection() as conn:
+                count = self.rebuild_activity_rollups(conn)
+                conn.commit()
+                return count
+        
+        conn.execute('DELETE FROM activity_rollups')
+        count = 0
+        for grain, expr in ROLLUP_GRAINS.items():
+            cursor = conn.execute(f'''
+                INSERT INTO activity_rollups (grain, bucket_start, department, category, activity_count, entries_awarded)
+                SELECT ?, {expr.format(ts='a.created_at')} AS bucket, COALESCE(e.department, '') AS dept,
+                       a.activity_category, COUNT(*), SUM(a.entries_awarded)
+                FROM activities a
+                LEFT JOIN employees e ON e.id = a.employee_id
+                GROUP BY bucket, dept, a.activity_category
+            ''', (grain,))
+            count += cursor.rowcount
+        return count
+    
     def _create_default_admin(self, conn):
         """Create default admin user if none exists"""
         import bcrypt
@@ -161,7 +384,8 @@ class DatabaseManager:
         if cursor.fetchone()[0] == 0:
             # Create default admin user
             password = 'Homeinstead3042'  # Should be changed immediately in production
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            password_hash = bcrypt.hashpw(password.encode('utf-8'),
+                                          bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)).decode('utf-8')
             
             conn.execute('''
                 INSERT INTO users (email, password_hash, role, name)
@@ -216,31 +440,98 @@ class DatabaseManager:
         except Exception as e:
             print(f"Error migrating JSON data: {e}")
     
-    def backup_database(self) -> str:
-        """Create a backup of the database"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(self.backup_path, f'raffle_backup_{timestamp}.db')
+    def get_data_version(self, conn=None) -> int:
+        """Return the current data version stamp"""
+        if conn is None:
+            with self.read_connection() as conn:
+                return self.get_data_version(conn)
+
+        row = conn.execute("SELECT value FROM settings WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def get_data_epoch(self, conn=None) -> str:
+        """Return the random token that, with the data version, identifies this database's state"""
+        if conn is None:
+            with self.read_connection() as conn:
+                return self.get_data_epoch(conn)
+
+        row = conn.execute("SELECT value FROM settings WHERE key = 'data_epoch'").fetchone()
+        return row[0] if row else ''
+
+    @staticmethod
+    def renew_data_epoch(conn):
+        """Start a new epoch, for a database whose data version may have gone backwards"""
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('data_epoch', ?)",
+                     (secrets.token_hex(4),))
+
+    def backup_to(self, target: sqlite3.Connection, progress=None):
+        """Copy a consistent snapshot of the database into another connection.
+        
+        The copy runs as one step of the SQLite backup API. In WAL mode that step
+        only holds a read snapshot, so writers carry on meanwhile; a copy split
+        into several steps restarts whenever another connection commits, and
+        under a steady write load it may never finish.
+        """
+        source = sqlite3.connect(self.db_path, timeout=Config.SQLITE_BUSY_TIMEOUT / 1000.0)
+        try:
+            source.backup(target, pages=-1, progress=progress)
+        finally:
+            source.close()
+    
+    def backup_database(self, progress=None, backup_file: str = None) -> str:
+        """Create a consistent online backup of the database as a single file.
+        
+        Uses the SQLite backup API, which (unlike a file copy) includes pages
+        still in the WAL.
+        """
+        if backup_file is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            backup_file = os.path.join(self.backup_path, f'raffle_backup_{timestamp}.db')
+        tmp_file = backup_file + '.tmp'
         
         try:
-            shutil.copy2(self.db_path, backup_file)
+            target = sqlite3.connect(tmp_file)
+            try:
+                self.backup_to(target, progress=progress)
+                # Keep the backup a single self-contained file
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+            
+            # Only a finished copy ever carries the final name
+            os.replace(tmp_file, backup_file)
             return backup_file
         except Exception as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
             raise Exception(f"Failed to create backup: {e}")
     
     def log_audit(self, user_id: Optional[int], action: str, table_name: str = None, 
                   record_id: int = None, old_values: Dict = None, new_values: Dict = None,
-                  ip_address: str = None, user_agent: str = None):
-        """Log audit trail for security and compliance"""
-        with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO audit_log 
-                (user_id, action, table_name, record_id, old_values, new_values, ip_address, user_agent)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, action, table_name, record_id,
-                 json.dumps(old_values) if old_values else None,
-                 json.dumps(new_values) if new_values else None,
-                 ip_address, user_agent))
-            conn.commit()
+                  ip_address: str = None, user_agent: str = None, notes: str = None,
+                  sync: bool = False):
+        """Log audit trail for security and compliance.
+        
+        Records are queued and written in batches by the audit writer. Pass
+        sync=True for actions that must be durable before the request returns;
+        the record is committed after everything logged before it, or this raises.
+        """
+        if notes:
+            new_values = dict(new_values or {}, notes=notes)
+        
+        record = (user_id, action, table_name, record_id,
+                  json.dumps(old_values) if old_values else None,
+                  json.dumps(new_values) if new_values else None,
+                  ip_address, user_agent,
+                  datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        
+        if sync or not Config.AUDIT_ASYNC:
+            # Keep ordering: anything queued before this record is committed first, and a
+            # failure raises here instead of losing the record
+            self.audit_writer.flush()
+            self.audit_writer.write_now([record])
+        else:
+            self.audit_writer.submit(record)
 
 # Global database instance
 db = DatabaseManager()
\ No newline at end of file
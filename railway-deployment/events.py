@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from config import Config
+
+class ChangeFeed:
+    """Change events shared across gunicorn workers through the change_events table"""
+
+    def __init__(self, database, max_streams: int = None):
+        self.database = database
+        self.max_streams = max_streams if max_streams is not None else Config.EVENT_MAX_STREAMS
+        self._stream_slots = threading.BoundedSemaphore(self.max_streams)
+
+    def acquire_stream(self) -> bool:
+        """Claim one of this worker's stream slots; False when they are all taken"""
+        return self._stream_slots.acquire(blocking=False)
+
+    def release_stream(self):
+        """Give back a slot claimed with acquire_stream once its stream has closed"""
+        self._stream_slots.release()
+
+    def publish(self, conn, event_type: str, data: Dict) -> int:
+        """Record an event on the caller's connection (committed with the caller's transaction)"""
+        cursor = conn.execute(
+            'INSERT INTO change_events (event_type, payload) VALUES (?, ?)',
+            (event_type, json.dumps(data))
+        )
+        event_id = cursor.lastrowid
+
+        # Trim old events now and then instead of on every write
+        if event_id % 500 == 0:
+            conn.execute(
+                "DELETE FROM change_events WHERE created_at < datetime('now', ?)",
+                (f'-{Config.EVENT_RETENTION_SECONDS} seconds',)
+            )
+        return event_id
+
+    def latest_id(self, conn) -> int:
+        """Return the id of the newest event"""
+        row = conn.execute('SELECT MAX(id) FROM change_events').fetchone()
+        return row[0] or 0
+
+    def read_since(self, conn, last_id: int, limit: int = 100) -> List[Dict]:
+        """Return events newer than last_id, oldest first"""
+        cursor = conn.execute('''
+            SELECT id, event_type, payload FROM change_events
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, limit))
+        return [{'id': row['id'], 'type': row['event_type'], 'data': json.loads(row['payload'])}
+                for row in cursor.fetchall()]
+
+    def stream(self, last_event_id: Optional[int] = None) -> Iterator[str]:
+        """Yield Server-Sent Events until the stream's lifetime runs out"""
+        # A stream holds its worker thread for as long as it is open, and EventSource reconnects
+        # (with Last-Event-ID) a second after it ends, so an open dashboard holds a thread for good.
+        # Callers must hold a slot from acquire_stream, which caps how many threads streams can take.
+        with self.database.read_connection() as conn:
+            if last_event_id is None:
+                last_event_id = self.latest_id(conn)
+
+        # Tell the browser how soon to reconnect after we close
+        yield 'retry: 1000\n\n'
+
+        deadline = time.monotonic() + Config.EVENT_STREAM_MAX_SECONDS
+        last_write = time.monotonic()
+        while time.monotonic() < deadline:
+            with self.database.read_connection() as conn:
+                events = self.read_since(conn, last_event_id)
+
+            for event in events:
+                last_event_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+            if events:
+                last_write = time.monotonic()
+                continue
+
+            # Comment lines keep proxies from closing an idle stream
+            if time.monotonic() - last_write >= Config.EVENT_HEARTBEAT_SECONDS:
+                yield ': heartbeat\n\n'
+                last_write = time.monotonic()
+
+            time.sleep(Config.EVENT_POLL_INTERVAL)
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings shared by every deploy (the Procfile passes the rest on the command line)
+"""
+import os
+import shutil
+import tempfile
+
+# Workers record metrics in files here so /metrics on any worker reports the whole app.
+# It must be set before the workers import prometheus_client, which is why it lives here.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'raffle_metrics'))
+
+# Imported up front: child_exit runs from the SIGCHLD handler, and several workers exiting at once
+# would otherwise re-enter a half-finished import
+from prometheus_client import multiprocess
+
+def on_starting(server):
+    """Start from an empty metrics directory so counters from a previous run are not summed in"""
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def post_fork(server, worker):
+    """Tell the app its thread count, so the event stream cap can leave threads for ordinary requests"""
+    os.environ['GUNICORN_THREADS'] = str(server.cfg.threads)
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (in-flight requests) from the totals"""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict
+import bcrypt
+from config import Config
+from metrics import BCRYPT_REJECTED, BCRYPT_VERIFY_LATENCY
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is full or a queued hash waited past its timeout"""
+
+class PasswordHasher:
+    """Runs bcrypt on a small bounded thread pool instead of the request threads"""
+
+    def __init__(self, rounds: int = None, threads: int = None, queue_max: int = None, timeout: float = None):
+        self.rounds = rounds or Config.BCRYPT_ROUNDS
+        self.threads = threads or Config.BCRYPT_THREADS
+        self.queue_max = queue_max if queue_max is not None else Config.BCRYPT_QUEUE_MAX
+        self.timeout = timeout if timeout is not None else Config.BCRYPT_TIMEOUT
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._in_flight = 0
+        self._counters = {'completed': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _submit(self, fn, *args):
+        """Queue a job, or refuse at once when threads + queue_max jobs are already outstanding"""
+        with self._lock:
+            # Threads do not survive a fork, so each gunicorn worker starts its own pool on first use
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+                self._in_flight = 0
+            if self._in_flight >= self.threads + self.queue_max:
+                self._counters['rejected'] += 1
+                BCRYPT_REJECTED.inc()
+                raise HasherBusy('Password hashing is at capacity')
+            self._in_flight += 1
+            future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._counters['completed'] += 1
+
+    def _run(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # The job still runs to completion and frees its slot then; this request stops waiting
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise HasherBusy('Password hashing timed out') from None
+
+    @staticmethod
+    def _verify(password: bytes, password_hash: bytes) -> bool:
+        with BCRYPT_VERIFY_LATENCY.time():
+            return bcrypt.checkpw(password, password_hash)
+
+    def hash(self, password: str) -> str:
+        """Hash a password at the configured work factor"""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Check a password against its stored hash"""
+        return self._run(self._verify, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True when a stored hash was made at a different work factor than the configured one"""
+        try:
+            # $2b$12$<salt and digest>
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> Dict:
+        """Pool size, queue depth and outcome counters for monitoring"""
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'threads': self.threads,
+                'queue_max': self.queue_max,
+                'in_flight': self._in_flight,
+                **self._counters
+            }
+
+# bcrypt releases the GIL while it works, so these threads hash on other cores while the
+# request threads keep serving
+password_hasher = PasswordHasher()
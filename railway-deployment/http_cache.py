@@ -0,0 +1,42 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from database import db
+
+def conditional_get(f=None, *, validator=None):
+    """Decorator answering If-None-Match with 304 while the data version is unchanged.
+    
+    Views whose output also depends on something outside the request - such as
+    today's date - pass validator, a callable whose result is folded into the ETag.
+    """
+    if f is None:
+        return lambda view: conditional_get(view, validator=validator)
+    
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # The data version moves on every employee/activity write, so it is a
+        # valid validator for any representation built from those tables
+        # The epoch changes when the database is recreated or restored, since the
+        # version restarts from an older number then
+        with db.read_connection() as conn:
+            epoch = db.get_data_epoch(conn)
+            version = db.get_data_version(conn)
+        variant_key = request.full_path
+        if validator is not None:
+            variant_key += f'|{validator()}'
+        variant = hashlib.sha1(variant_key.encode('utf-8')).hexdigest()[:12]
+        etag = f'e{epoch}-v{version}-{variant}'
+        
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    return decorated_function
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Load-test the app under gunicorn with concurrent virtual users
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Cookie both apps accept in place of a login session
+AUTH_COOKIE = 'auth=Homeinstead3042'
+LOGIN = {'email': 'homecare@homeinstead.com', 'password': 'Homeinstead3042'}
+
+# What each virtual-user action sends, per app, as (method, path, JSON body); {employee_id} is filled
+# in per request and a body of 'excel' means a generated spreadsheet upload. app.py has no draw endpoint.
+ACTIONS = {
+    'app': {
+        'login': ('POST', '/login', LOGIN),
+        'roster': ('GET', '/api/employees?limit=50', None),
+        'award': ('POST', '/api/employee/{employee_id}/add_entry',
+                  {'activity_name': 'Load test', 'entries_awarded': 1}),
+        'import': ('POST', '/api/import_excel', 'excel'),
+    },
+    'app_complex': {
+        'login': ('POST', '/login', LOGIN),
+        'roster': ('GET', '/api/employees?limit=50', None),
+        'award': ('POST', '/api/employee/{employee_id}/add_entry',
+                  {'activity_name': 'Load test', 'activity_category': 'manual', 'entries_awarded': 1}),
+        'import': ('POST', '/api/import_excel', 'excel'),
+        'draw': ('POST', '/api/raffle/conduct', {}),
+    },
+}
+
+# Relative weights of each action, roughly a manager's day at quarter-end; apps without an action skip it
+DEFAULT_MIX = {'login': 5, 'roster': 60, 'award': 25, 'import': 2, 'draw': 8}
+
+# Error bodies that mean SQLite gave up waiting for a lock
+BUSY_PATTERN = re.compile(rb'database is locked|database is busy|SQLITE_BUSY', re.IGNORECASE)
+BUSY_METRICS = ('raffle_db_busy_retries_total', 'raffle_db_busy_failures_total')
+
+def parse_mix(spec, app_name):
+    """Parse 'roster=60,award=25' into action names and weights, dropping zero weights"""
+    mix = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ACTIONS[app_name]:
+            raise ValueError(f"{app_name} has no '{name}' action (choose from {', '.join(ACTIONS[app_name])})")
+        mix[name] = float(weight or 1)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError('The mix has no actions with a positive weight')
+    return mix
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def excel_upload(rng, rows):
+    """A multipart body holding a small roster spreadsheet with fresh names, and its content type"""
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Name', 'Department'])
+    for _ in range(rows):
+        sheet.append([f'Load Test {uuid.UUID(int=rng.getrandbits(128)).hex[:12]}', 'Load Test'])
+    content = io.BytesIO()
+    workbook.save(content)
+
+    boundary = uuid.UUID(int=rng.getrandbits(128)).hex
+    body = (f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="file"; filename="loadtest.xlsx"\r\n'
+            'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+            ).encode() + content.getvalue() + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+class VirtualUser(threading.Thread):
+    """One keep-alive client picking weighted actions until the deadline"""
+
+    def __init__(self, index, base_url, actions, mix, employee_ids, deadline, start_at, args):
+        super().__init__(name=f'vu-{index}', daemon=True)
+        self.base = urlsplit(base_url)
+        self.actions = actions
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.employee_ids = employee_ids
+        self.deadline = deadline
+        self.start_at = start_at
+        self.think = args.think_ms / 1000.0
+        self.import_rows = args.import_rows
+        self.timeout = args.timeout
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.conn = None
+
+        self.timings = {name: [] for name in self.names}
+        self.statuses = {name: Counter() for name in self.names}
+        self.busy = Counter()
+
+    def _connect(self):
+        self.conn = http.client.HTTPConnection(self.base.hostname, self.base.port or 80, timeout=self.timeout)
+
+    def _request(self, name):
+        method, path, body = self.actions[name]
+        headers = {'Cookie': AUTH_COOKIE}
+        if body == 'excel':
+            payload, headers['Content-Type'] = excel_upload(self.rng, self.import_rows)
+        elif body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            payload = None
+        path = path.format(employee_id=self.rng.choice(self.employee_ids))
+
+        reused = self.conn is not None
+        if not reused:
+            self._connect()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not reused:
+                raise
+            # gunicorn closed the idle keep-alive connection; that is not the request failing
+            self.conn.close()
+            self._connect()
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+        data = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self.conn.close()
+            self.conn = None
+        return response.status, data
+
+    def run(self):
+        time.sleep(max(self.start_at - time.monotonic(), 0))
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, data = self._request(name)
+            except (OSError, http.client.HTTPException):
+                # Refused, reset or timed out; count it and start over on a new connection
+                status, data = 'connection', b''
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+            self.timings[name].append(time.perf_counter() - started)
+            self.statuses[name][status] += 1
+            if status != 'connection' and status >= 500 and BUSY_PATTERN.search(data):
+                self.busy[name] += 1
+            if self.think:
+                time.sleep(self.rng.uniform(0, 2 * self.think))
+        if self.conn is not None:
+            self.conn.close()
+
+def http_get(base_url, path, headers=None, timeout=10.0):
+    parts = urlsplit(base_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+def busy_counters(base_url, token=None):
+    """SQLITE_BUSY retries and failures so far, summed over every worker, from /metrics"""
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    try:
+        status, data = http_get(base_url, '/metrics', headers)
+    except (OSError, http.client.HTTPException):
+        return None
+    if status != 200:
+        return None
+    counters = dict.fromkeys(BUSY_METRICS, 0.0)
+    for line in data.decode().splitlines():
+        name, _, value = line.partition(' ')
+        if name in counters:
+            counters[name] += float(value)
+    return counters
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def seed_database(args, env):
+    """Build a fresh database with manage.py seed"""
+    command = [sys.executable, os.path.join(HERE, 'manage.py'), 'seed', '--employees', str(args.employees),
+               '--activities', str(args.activities), '--seed', str(args.seed)]
+    print(f"Seeding {args.employees} employees and {args.activities} activities...")
+    # Bulk inserts are slow by design, so keep them out of the slow-query log; the metrics
+    # directory only exists once gunicorn starts, so the seed process keeps its metrics in memory
+    env = {k: v for k, v in env.items() if k != 'PROMETHEUS_MULTIPROC_DIR'}
+    subprocess.run(command, env=dict(env, SLOW_QUERY_MS='3600000'), cwd=HERE, check=True,
+                   stdout=subprocess.DEVNULL)
+
+def start_server(args, workdir):
+    """Run gunicorn on a free local port against a database in workdir; returns the process and its URL"""
+    db_path = os.path.join(workdir, 'raffle.db')
+    env = dict(os.environ, DATABASE_PATH=db_path, BACKUP_PATH=os.path.join(workdir, 'backups'),
+               UPLOAD_PATH=os.path.join(workdir, 'uploads'),
+               CACHE_PATH=os.path.join(workdir, 'result_cache.db'),
+               AUDIT_ARCHIVE_PATH=os.path.join(workdir, 'audit_archive'),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+               LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+    if not args.keep_rate_limits:
+        # Every virtual user shares one address, so the per-IP limits would throttle the test itself
+        env['RATELIMIT_ENABLED'] = 'false'
+    env.pop('METRICS_TOKEN', None)
+
+    if args.database:
+        shutil.copyfile(args.database, db_path)
+    else:
+        seed_database(args, env)
+
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', f'{args.app}:app', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers), '--threads', str(args.threads),
+               '--timeout', str(int(args.timeout) + 30)]
+    print(f"Starting gunicorn: {args.app}, {args.workers} workers x {args.threads} threads")
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    server = subprocess.Popen(command, cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            if http_get(base_url, '/metrics', timeout=2)[0] == 200:
+                return server, base_url
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError('gunicorn did not start within 60s')
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def employee_ids(base_url):
+    """Active employee ids, so awards do not 404"""
+    status, data = http_get(base_url, '/api/employees?fields=id&include_activities=false',
+                            {'Cookie': AUTH_COOKIE}, timeout=120)
+    if status != 200:
+        raise RuntimeError(f'Could not list employees: HTTP {status}')
+    ids = [e['id'] for e in json.loads(data)['employees']]
+    if not ids:
+        raise RuntimeError('The database has no active employees to award entries to')
+    return ids
+
+def summarize(name, timings, statuses, busy, elapsed):
+    timings = sorted(timings)
+    requests = len(timings)
+    errors = sum(count for status, count in statuses.items() if status == 'connection' or status >= 400)
+    row = {
+        'action': name,
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'busy_errors': busy,
+        'throughput_rps': round(requests / elapsed, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    }
+    for label, pct in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99), ('max_ms', 100)):
+        value = percentile(timings, pct)
+        row[label] = round(value * 1000, 3) if value is not None else None
+    return row
+
+def run_load(args, base_url):
+    mix = parse_mix(args.mix, args.app)
+    actions = ACTIONS[args.app]
+    ids = employee_ids(base_url)
+    busy_before = busy_counters(base_url, args.metrics_token)
+
+    print(f"Running {args.users} virtual users for {args.duration:g}s "
+          f"(ramp-up {args.ramp_up:g}s) against {base_url}")
+    now = time.monotonic()
+    deadline = now + args.ramp_up + args.duration
+    users = [VirtualUser(i, base_url, actions, mix, ids, deadline,
+                         now + args.ramp_up * i / max(args.users, 1), args)
+             for i in range(args.users)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join(deadline - time.monotonic() + args.timeout + 5)
+    elapsed = time.perf_counter() - started
+
+    busy_after = busy_counters(base_url, args.metrics_token)
+    rows = []
+    for name in mix:
+        timings = [t for user in users for t in user.timings[name]]
+        statuses = sum((user.statuses[name] for user in users), Counter())
+        rows.append(summarize(name, timings, statuses, sum(user.busy[name] for user in users), elapsed))
+    total = summarize('total', [t for user in users for ts in user.timings.values() for t in ts],
+                      sum((c for user in users for c in user.statuses.values()), Counter()),
+                      sum(sum(user.busy.values()) for user in users), elapsed)
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'app': args.app,
+        'settings': {'users': args.users, 'duration': args.duration, 'ramp_up': args.ramp_up,
+                     'think_ms': args.think_ms, 'mix': mix, 'workers': args.workers, 'threads': args.threads,
+                     'rate_limits': args.keep_rate_limits, 'employees': len(ids)},
+        'elapsed_seconds': round(elapsed, 3),
+        'actions': rows,
+        'total': total,
+        'sqlite_busy': None
+    }
+    if busy_before is not None and busy_after is not None:
+        report['sqlite_busy'] = {name: busy_after[name] - busy_before[name] for name in BUSY_METRICS}
+    return report
+
+def print_report(report):
+    print(f"\n{'action':<8} {'requests':>8} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} "
+          f"{'errors':>7} {'busy':>5}")
+    for row in report['actions'] + [report['total']]:
+        latencies = ' '.join(f"{row[k]:>7.1f}ms" if row[k] is not None else f"{'-':>9}"
+                             for k in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        print(f"{row['action']:<8} {row['requests']:>8} {row['throughput_rps']:>8.1f} {latencies} "
+              f"{row['error_rate'] * 100:>6.2f}% {row['busy_errors']:>5}")
+    statuses = ', '.join(f'{status}: {count}' for status, count in report['total']['statuses'].items())
+    print(f"\nStatus codes: {statuses}")
+    busy = report['sqlite_busy']
+    if busy is None:
+        print("SQLITE_BUSY: /metrics unavailable, only failed responses counted above")
+    else:
+        print(f"SQLITE_BUSY: {busy['raffle_db_busy_retries_total']:g} write retries, "
+              f"{busy['raffle_db_busy_failures_total']:g} writes failed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--app', default='app_complex', choices=sorted(ACTIONS), help='App to serve (default: app_complex)')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of full load after ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='Seconds over which users start')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Mean pause between a user\'s requests')
+    parser.add_argument('--mix', default=None, help='Action weights, e.g. roster=60,award=25 (default: ' +
+                        ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()) + ')')
+    parser.add_argument('--import-rows', type=int, default=20, help='Employees in each uploaded spreadsheet')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+    parser.add_argument('--database', default=None, help='Copy this database instead of seeding a new one')
+    parser.add_argument('--employees', type=int, default=1000, help='Employees to seed')
+    parser.add_argument('--activities', type=int, default=20000, help='Activities to seed')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the data and the request mix')
+    parser.add_argument('--url', default=None, help='Load an already running server instead of starting one')
+    parser.add_argument('--metrics-token', default=os.getenv('METRICS_TOKEN'),
+                        help='Bearer token for /metrics when targeting --url')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='Leave the per-IP rate limits on')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as failed')
+    parser.add_argument('--output', default=None, help='Also write the report to this JSON file')
+    parser.add_argument('--server-log', default=None, help='Keep the gunicorn output in this file')
+    args = parser.parse_args(argv)
+
+    if args.mix is None:
+        args.mix = ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items() if name in ACTIONS[args.app])
+    try:
+        parse_mix(args.mix, args.app)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.url:
+        report = run_load(args, args.url.rstrip('/'))
+    else:
+        with tempfile.TemporaryDirectory(prefix='raffle_load_') as workdir:
+            server, base_url = start_server(args, workdir)
+            try:
+                report = run_load(args, base_url)
+            finally:
+                stop_server(server)
+                if args.server_log:
+                    shutil.copyfile(os.path.join(workdir, 'server.log'), args.server_log)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.output}")
+    return report['total']['errors'] == 0
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
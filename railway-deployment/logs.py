@@ -0,0 +1,131 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+from config import Config
+
+# Every application logger lives under this one, e.g. raffle.auth or raffle.import
+ROOT_LOGGER = 'raffle'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# Attributes every LogRecord has; anything else arrived through extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields next to the message"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Let through a fraction of a logger's records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread and drops them rather than block when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only render the message here, while its arguments are still current; JSON encoding
+        # and the write to stdout happen on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_handler = None
+_listener = None
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse 'raffle.import=0.01,raffle.employees=0.1' into logger names and rates"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+def _start_listener(stream_handler: logging.Handler):
+    """Give the handler a fresh queue and a listener thread to drain it"""
+    global _listener
+    log_queue = queue.Queue(Config.LOG_QUEUE_MAX)
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+def _stop_listener():
+    """Flush whatever is still queued"""
+    if _listener is not None:
+        _listener.stop()
+
+def init_logging(level: str = None, fmt: str = None, sample_rates: str = None) -> logging.Logger:
+    """Route the raffle loggers through a background queue to stdout; safe to call more than once"""
+    global _handler
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel((level or Config.LOG_LEVEL).upper())
+
+    if _handler is None:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if (fmt or Config.LOG_FORMAT).lower() == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        _handler = NonBlockingQueueHandler(queue.Queue(Config.LOG_QUEUE_MAX))
+        _start_listener(stream_handler)
+        # A forked worker inherits the queue but not the listener thread, so it needs its own
+        os.register_at_fork(after_in_child=lambda: _start_listener(stream_handler))
+        atexit.register(_stop_listener)
+        logger.addHandler(_handler)
+        logger.propagate = False
+
+    rates = parse_sample_rates(sample_rates if sample_rates is not None else Config.LOG_SAMPLE_RATES)
+    for name, rate in rates.items():
+        sampled = logging.getLogger(name)
+        for existing in [f for f in sampled.filters if isinstance(f, SamplingFilter)]:
+            sampled.removeFilter(existing)
+        sampled.addFilter(SamplingFilter(rate))
+    return logger
+
+def dropped_records() -> int:
+    """Records discarded because the log queue was full"""
+    return _handler.dropped if _handler is not None else 0
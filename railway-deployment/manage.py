@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the raffle database
+"""
+import argparse
+import os
+import sys
+from database import DatabaseManager
+from audit_archive import AuditArchive
+from backup_store import BackupStore
+from seed import Seeder
+
+def rebuild_stats(db, args):
+    """Rebuild the department_stats summary table from the employees table"""
+    count = db.rebuild_department_stats()
+    print(f"✓ Rebuilt department_stats ({count} departments)")
+    return True
+
+def rebuild_rollups(db, args):
+    """Rebuild the activity_rollups table from the activities table"""
+    count = db.rebuild_activity_rollups()
+    print(f"✓ Rebuilt activity_rollups ({count} buckets)")
+    return True
+
+def archive_audit(db, args):
+    """Move audit rows past the retention window into compressed segments"""
+    result = AuditArchive(db).archive(args.days)
+    print(f"✓ Archived {result['rows_archived']} audit rows older than {result['cutoff']} "
+          f"into {result['segments']} segments")
+    return True
+
+def create_backup(db, args):
+    """Store an incremental backup of the live database"""
+    manifest = BackupStore(db).create()
+    print(f"✓ Backup {manifest['id']}: {manifest['new_chunks']} of {len(manifest['chunks'])} chunks new, "
+          f"{manifest['stored_bytes']} bytes stored")
+    return True
+
+def list_backups(db, args):
+    """Show stored backups and how much disk the store uses"""
+    store = BackupStore(db)
+    for manifest in store.list_backups():
+        print(f"{manifest['id']}  {manifest['created_at']}  {manifest['size']:>12} bytes  "
+              f"{manifest['new_chunks']:>6} new chunks")
+    usage = store.usage()
+    print(f"{usage['backups']} backups, {usage['logical_bytes']} bytes logical, "
+          f"{usage['stored_bytes']} bytes on disk")
+    return True
+
+def verify_backups(db, args):
+    """Check that every chunk of the stored backups is present and intact"""
+    problems = BackupStore(db).verify(args.id)
+    ok = True
+    for backup_id, errors in problems.items():
+        if errors:
+            ok = False
+            print(f"❌ {backup_id}: {len(errors)} problems")
+            for error in errors:
+                print(f"   {error}")
+        else:
+            print(f"✓ {backup_id}")
+    return ok
+
+def restore_backup(db, args):
+    """Rebuild a stored backup as a database file"""
+    target = args.target or db.db_path
+    if os.path.exists(target) and not args.force:
+        print(f"❌ {target} exists; stop the app and pass --force to overwrite it")
+        return False
+    manifest = BackupStore(db).restore(args.id, target)
+    print(f"✓ Restored backup {manifest['id']} to {target}")
+    return True
+
+def prune_backups(db, args):
+    """Apply the backup retention policy and drop unused chunks"""
+    result = BackupStore(db).prune()
+    print(f"✓ Kept {result['kept_backups']} backups, removed {result['removed_backups']} backups "
+          f"and {result['removed_chunks']} chunks ({result['freed_bytes']} bytes)")
+    return True
+
+def seed_data(db, args):
+    """Fill the database with synthetic employees, activities, raffles and audit rows"""
+    seeder = Seeder(db, seed=args.seed, end_date=args.end, progress=lambda message: print(f"  {message}"))
+    try:
+        result = seeder.seed_database(args.employees, args.activities, audit_rows=args.audit_rows,
+                                      raffles=args.raffles, managers=args.managers, days=args.days,
+                                      force=args.force)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"✓ Seeded {result['employees']} employees, {result['activities']} activities, "
+          f"{result['raffles']} raffles and {result['audit_rows']} audit rows in {result['seconds']}s")
+    return True
+
+COMMANDS = {
+    'rebuild-stats': (rebuild_stats, 'Backfill or repair the department_stats summary table'),
+    'rebuild-rollups': (rebuild_rollups, 'Backfill or repair the activity_rollups table'),
+    'archive-audit': (archive_audit, 'Archive audit rows older than the retention window'),
+    'backup': (create_backup, 'Store an incremental backup of the database'),
+    'list-backups': (list_backups, 'List stored backups'),
+    'verify-backups': (verify_backups, 'Verify stored backups chunk by chunk'),
+    'restore-backup': (restore_backup, 'Restore a stored backup to a database file'),
+    'prune-backups': (prune_backups, 'Apply the hourly/daily/weekly backup retention policy'),
+    'seed': (seed_data, 'Generate synthetic data for load testing (deterministic per --seed)'),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (handler, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    
+    subparsers.choices['archive-audit'].add_argument(
+        '--days', type=int, default=None, help='Retention window in days (default: AUDIT_RETENTION_DAYS)')
+    subparsers.choices['verify-backups'].add_argument(
+        '--id', default=None, help='Verify a single backup (default: all)')
+    subparsers.choices['restore-backup'].add_argument('id', help='Backup id from list-backups')
+    subparsers.choices['restore-backup'].add_argument(
+        '--target', default=None, help='Database file to write (default: DATABASE_PATH)')
+    subparsers.choices['restore-backup'].add_argument(
+        '--force', action='store_true', help='Overwrite an existing database file')
+    seed_parser = subparsers.choices['seed']
+    seed_parser.add_argument('--employees', type=int, default=1000, help='Employees to create')
+    seed_parser.add_argument('--activities', type=int, default=20000, help='Activity awards to create')
+    seed_parser.add_argument('--audit-rows', type=int, default=None, help='Audit rows (default: one per activity)')
+    seed_parser.add_argument('--raffles', type=int, default=8, help='Past raffle draws')
+    seed_parser.add_argument('--managers', type=int, default=5, help='Manager users who award entries')
+    seed_parser.add_argument('--days', type=int, default=365, help='Days of history before --end')
+    seed_parser.add_argument('--end', default=None, help='Last day of history, YYYY-MM-DD (default: today)')
+    seed_parser.add_argument('--seed', type=int, default=1, help='Random seed; same seed and --end, same data')
+    seed_parser.add_argument('--force', action='store_true', help='Add to a database that already has employees')
+    
+    args = parser.parse_args(argv)
+    handler = COMMANDS[args.command][0]
+    
+    db = DatabaseManager()
+    return handler(db, args)
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
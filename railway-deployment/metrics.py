@@ -0,0 +1,108 @@
+import hmac
+import os
+import time
+from flask import Response, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from config import Config
+
+# With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does this before the workers start)
+# every worker writes its samples to files there, and a scrape of any worker sums them all
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Statement kinds get their own series; anything else is counted as OTHER
+STATEMENT_KINDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK',
+                   'SAVEPOINT', 'RELEASE', 'PRAGMA')
+
+REQUEST_LATENCY = Histogram(
+    'raffle_http_request_duration_seconds', 'Request latency by Flask endpoint and status code',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'raffle_http_requests_in_flight', 'Requests currently being handled', multiprocess_mode='livesum'
+)
+DB_QUERY_LATENCY = Histogram(
+    'raffle_db_query_duration_seconds', 'SQL statement latency by statement kind', ['statement'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+)
+DB_BUSY_RETRIES = Counter('raffle_db_busy_retries_total', 'Write groups retried after SQLITE_BUSY')
+DB_BUSY_FAILURES = Counter('raffle_db_busy_failures_total', 'Writes failed because the database stayed busy')
+BCRYPT_VERIFY_LATENCY = Histogram(
+    'raffle_bcrypt_verify_seconds', 'Time spent checking a password hash',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+BCRYPT_REJECTED = Counter('raffle_bcrypt_rejected_total', 'Password hashes refused because the hashing pool was full')
+IMPORT_LATENCY = Histogram(
+    'raffle_excel_import_duration_seconds', 'Excel import time, parsing through commit',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+IMPORT_ROWS = Counter('raffle_excel_import_rows_total', 'Employees read from Excel imports by outcome', ['result'])
+BACKUP_LATENCY = Histogram(
+    'raffle_backup_duration_seconds', 'Background backup time by outcome', ['status'],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+BACKUP_SIZE = Gauge(
+    'raffle_backup_size_bytes', 'Size of the most recent backup; logical is the database, stored is new chunks',
+    ['kind'], multiprocess_mode='mostrecent'
+)
+
+# Bound once, so the per-statement hot path skips the label lookup
+_query_latency = {kind: DB_QUERY_LATENCY.labels(kind) for kind in STATEMENT_KINDS + ('OTHER',)}
+
+def observe_query(sql: str, elapsed: float):
+    """Record one SQL statement's latency under its statement kind"""
+    words = sql.lstrip().split(None, 1)
+    kind = words[0].upper() if words else 'OTHER'
+    _query_latency.get(kind, _query_latency['OTHER']).observe(elapsed)
+
+def record_import(elapsed: float, added: int, skipped: int, errors: int = 0):
+    """Record one Excel import's duration and row outcomes"""
+    IMPORT_LATENCY.observe(elapsed)
+    IMPORT_ROWS.labels('added').inc(added)
+    IMPORT_ROWS.labels('skipped').inc(skipped)
+    IMPORT_ROWS.labels('error').inc(errors)
+
+def record_backup(elapsed: float, status: str, manifest: dict = None):
+    """Record one background backup's duration and, when it completed, its size"""
+    BACKUP_LATENCY.labels(status).observe(elapsed)
+    if manifest is not None:
+        BACKUP_SIZE.labels('logical').set(manifest['size'])
+        BACKUP_SIZE.labels('stored').set(manifest['stored_bytes'])
+
+def metrics_response() -> Response:
+    """Render every metric in the Prometheus text format"""
+    if Config.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {Config.METRICS_TOKEN}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    if MULTIPROCESS:
+        # A fresh registry per scrape, reading every worker's files
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+def init_metrics(app):
+    """Time every request and count the ones in flight"""
+
+    @app.before_request
+    def start_request_metrics():
+        request.metrics_started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def observe_request_metrics(response):
+        started = getattr(request, 'metrics_started', None)
+        if started is not None:
+            # The endpoint name, not the path, so ids in URLs do not explode the series count
+            REQUEST_LATENCY.labels(request.endpoint or 'unmatched', request.method,
+                                   str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(exc=None):
+        if getattr(request, 'metrics_started', None) is not None:
+            REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,133 @@
+import base64
+import json
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+# Columns a client may request through ?fields=
+EMPLOYEE_FIELDS = (
+    'id', 'name', 'email', 'phone', 'department', 'position',
+    'hire_date', 'photo_path', 'total_entries', 'is_active',
+    'created_at', 'updated_at'
+)
+
+# Sort keys exposed through ?sort= (prefix with - for descending)
+SORT_KEYS = ('name', 'total_entries', 'department')
+NOT_NULL_SORT_KEYS = ('name',)
+
+class PageRequestError(ValueError):
+    """Raised when the pagination query string is invalid"""
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    """Encode the last row of a page as an opaque cursor"""
+    raw = json.dumps([sort, value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    """Decode a cursor produced by encode_cursor for the same sort order"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise PageRequestError("Invalid cursor")
+
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise PageRequestError("Cursor does not match the requested sort order")
+    return value, row_id
+
+class EmployeePageRequest:
+    """Parsed ?limit=&cursor=&sort=&fields= parameters for the employee list"""
+
+    def __init__(self, args, computed_fields=()):
+        sort = args.get('sort', 'name')
+        self.descending = sort.startswith('-')
+        self.sort_key = sort.lstrip('-')
+        if self.sort_key not in SORT_KEYS:
+            raise PageRequestError(f"Invalid sort key. Use one of: {', '.join(SORT_KEYS)}")
+        self.sort = sort
+
+        limit = args.get('limit')
+        if limit is None:
+            self.limit = None
+        else:
+            try:
+                self.limit = int(limit)
+            except ValueError:
+                raise PageRequestError("limit must be an integer")
+            if self.limit < 1 or self.limit > Config.EMPLOYEE_PAGE_MAX:
+                raise PageRequestError(f"limit must be between 1 and {Config.EMPLOYEE_PAGE_MAX}")
+
+        cursor = args.get('cursor')
+        self.after = decode_cursor(cursor, self.sort) if cursor else None
+
+        fields = args.get('fields')
+        if fields:
+            self.fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in self.fields if f not in EMPLOYEE_FIELDS and f not in computed_fields]
+            if unknown:
+                raise PageRequestError(f"Unknown fields: {', '.join(unknown)}")
+        else:
+            self.fields = None
+
+    def columns(self) -> List[str]:
+        """Columns to select - the id and sort key are always needed for the cursor"""
+        requested = [f for f in (self.fields or EMPLOYEE_FIELDS) if f in EMPLOYEE_FIELDS]
+        for required in (self.sort_key, 'id'):
+            if required not in requested:
+                requested.append(required)
+        return requested
+
+    def wants(self, field: str) -> bool:
+        """Whether a field (including computed ones) was requested"""
+        return self.fields is None or field in self.fields
+
+    def _keyset_clause(self) -> Tuple[str, List]:
+        """Build the WHERE fragment that seeks past the cursor row"""
+        if self.after is None:
+            return '', []
+
+        value, row_id = self.after
+        col = self.sort_key
+        op = '<' if self.descending else '>'
+
+        # SQLite sorts NULLs first ascending and last descending
+        if value is None:
+            if self.descending:
+                return f'AND {col} IS NULL AND id < ?', [row_id]
+            return f'AND (({col} IS NULL AND id > ?) OR {col} IS NOT NULL)', [row_id]
+
+        # The leading bound keeps this an index range scan on the sort column
+        clause = f'{col} {op}= ? AND ({col} {op} ? OR id {op} ?)'
+        if self.descending and col not in NOT_NULL_SORT_KEYS:
+            clause = f'(({clause}) OR {col} IS NULL)'
+        return f'AND {clause}', [value, value, row_id]
+
+    def fetch(self, conn) -> Tuple[List[Dict], Optional[str]]:
+        """Run the page query and return (rows, next_cursor)"""
+        direction = 'DESC' if self.descending else 'ASC'
+        keyset, params = self._keyset_clause()
+        sql = f'''
+            SELECT {', '.join(self.columns())}
+            FROM employees
+            WHERE is_active = 1 {keyset}
+            ORDER BY {self.sort_key} {direction}, id {direction}
+        '''
+        if self.limit is not None:
+            # Fetch one extra row to know whether another page exists
+            sql += ' LIMIT ?'
+            params.append(self.limit + 1)
+
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+        next_cursor = None
+        if self.limit is not None and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(self.sort, last[self.sort_key], last['id'])
+
+        return rows, next_cursor
+
+    def project(self, rows: List[Dict]) -> List[Dict]:
+        """Drop helper columns the client did not ask for"""
+        if self.fields is None:
+            return rows
+        return [{k: v for k, v in row.items() if k in self.fields} for row in rows]
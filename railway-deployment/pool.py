@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+from urllib.parse import quote
+from config import Config
+from sql_timing import TimedConnection
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+class PooledConnection:
+    """Bookkeeping for one pooled sqlite3 connection"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.depth = 0
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections with health checks and idle reaping"""
+
+    def __init__(self, db_path: str, max_size: int = None, timeout: float = None,
+                 idle_seconds: float = None, min_idle: int = None, health_check_seconds: float = None,
+                 pragmas: Dict = None, read_only: bool = False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.max_size = max_size or Config.DB_POOL_SIZE
+        self.timeout = timeout if timeout is not None else Config.DB_POOL_TIMEOUT
+        self.idle_seconds = idle_seconds if idle_seconds is not None else Config.DB_POOL_IDLE_SECONDS
+        self.min_idle = min_idle if min_idle is not None else Config.DB_POOL_MIN_IDLE
+        self.health_check_seconds = (health_check_seconds if health_check_seconds is not None
+                                     else Config.DB_POOL_HEALTH_CHECK_SECONDS)
+        self.pragmas = pragmas if pragmas is not None else Config.SQLITE_PRAGMAS
+
+        self._idle: List[PooledConnection] = []
+        self._size = 0
+        self._condition = threading.Condition()
+        self._held = threading.local()
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+            'rollbacks_on_release': 0
+        }
+
+    def _connect(self) -> PooledConnection:
+        """Open a connection and apply the PRAGMA profile once"""
+        busy_timeout = self.pragmas.get('busy_timeout', 30000)
+        if self.read_only:
+            # SQLite itself rejects writes on these, and they never take the write lock
+            uri = f'file:{quote(os.path.abspath(self.db_path))}?mode=ro'
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=busy_timeout / 1000.0,
+                                         factory=TimedConnection)
+        else:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=busy_timeout / 1000.0,
+                                         factory=TimedConnection)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name}={value}')
+        self._counters['created'] += 1
+        return PooledConnection(connection)
+
+    def _close(self, pooled: PooledConnection):
+        try:
+            pooled.connection.close()
+        except sqlite3.Error:
+            pass
+        self._counters['closed'] += 1
+
+    def _healthy(self, pooled: PooledConnection) -> bool:
+        """Ping connections that sat idle long enough to have gone stale"""
+        if time.monotonic() - pooled.last_used < self.health_check_seconds:
+            return True
+        try:
+            pooled.connection.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            self._counters['health_check_failures'] += 1
+            return False
+
+    def _reap_idle(self):
+        """Close connections idle past the limit, keeping min_idle warm (caller holds the lock)"""
+        cutoff = time.monotonic() - self.idle_seconds
+        # Idle list is oldest first, so stale connections are at the front
+        while len(self._idle) > self.min_idle and self._idle[0].last_used < cutoff:
+            self._close(self._idle.pop(0))
+            self._size -= 1
+
+    def _acquire(self) -> PooledConnection:
+        """Take an idle connection, open a new one, or wait for one to be released"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._condition:
+            while True:
+                self._reap_idle()
+                while self._idle:
+                    # Most recently used first, its pages are likeliest to still be cached
+                    pooled = self._idle.pop()
+                    if self._healthy(pooled):
+                        break
+                    self._close(pooled)
+                    self._size -= 1
+                else:
+                    pooled = None
+
+                if pooled is None and self._size < self.max_size:
+                    self._size += 1
+                    try:
+                        pooled = self._connect()
+                    except Exception:
+                        self._size -= 1
+                        raise
+
+                if pooled is not None:
+                    self._counters['checkouts'] += 1
+                    return pooled
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s '
+                                      f'({self.max_size} in use)')
+                if not waited:
+                    waited = True
+                    self._counters['waits'] += 1
+                started = time.monotonic()
+                self._condition.wait(remaining)
+                self._counters['wait_seconds'] += time.monotonic() - started
+
+    def _release(self, pooled: PooledConnection):
+        """Return a connection, rolling back anything its user left uncommitted"""
+        try:
+            if pooled.connection.in_transaction:
+                pooled.connection.rollback()
+                self._counters['rollbacks_on_release'] += 1
+            healthy = True
+        except sqlite3.Error:
+            healthy = False
+
+        with self._condition:
+            if healthy:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            else:
+                self._close(pooled)
+                self._size -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; nested checkouts on one thread share it"""
+        pooled = getattr(self._held, 'pooled', None)
+        if pooled is None:
+            pooled = self._acquire()
+            self._held.pooled = pooled
+        pooled.depth += 1
+
+        try:
+            yield pooled.connection
+        except Exception:
+            pooled.connection.rollback()
+            raise
+        finally:
+            pooled.depth -= 1
+            if pooled.depth == 0:
+                self._held.pooled = None
+                self._release(pooled)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._condition:
+            while self._idle:
+                self._close(self._idle.pop())
+                self._size -= 1
+
+    def stats(self) -> Dict:
+        """Current pool occupancy plus lifetime counters"""
+        with self._condition:
+            idle = len(self._idle)
+            stats = dict(self._counters)
+            stats.update({
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle
+            })
+        stats['wait_seconds'] = round(stats['wait_seconds'], 4)
+        return stats
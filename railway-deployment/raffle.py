@@ -0,0 +1,184 @@
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Cryptographically secure source for all draws - raffle results must not be predictable
+_rng = random.SystemRandom()
+
+class AliasTable:
+    """Walker/Vose alias table for O(1) weighted sampling"""
+
+    def __init__(self, weights: Sequence[int]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("Cannot build an alias table without participants")
+
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("Total weight must be positive")
+
+        self.size = n
+        self.total = total
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        # Scale weights so the average bucket holds exactly 1.0
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Whatever is left is 1.0 up to floating point error
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random = None) -> int:
+        """Return the index of one weighted pick"""
+        rng = rng or _rng
+        i = rng.randrange(self.size)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+class FenwickTree:
+    """Binary indexed tree over integer weights with O(log n) update and search"""
+
+    def __init__(self, weights: Sequence[int]):
+        self.size = len(weights)
+        self.tree = [0] + list(weights)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(weights)
+
+    def add(self, index: int, delta: int):
+        """Add delta to the weight at a zero-based index"""
+        self.total += delta
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target: int) -> int:
+        """Return the zero-based index whose cumulative range contains target (0 <= target < total)"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+class RaffleDraw:
+    """Immutable snapshot of the eligible participants and their alias table"""
+
+    def __init__(self, version: int, participants: List[Dict]):
+        self.version = version
+        self.participants = participants
+        self.total_entries = sum(p['entries'] for p in participants)
+        self.table = AliasTable([p['entries'] for p in participants]) if participants else None
+
+    def draw(self, rng: random.Random = None) -> Dict:
+        """Pick one winner in O(1)"""
+        if self.table is None:
+            raise ValueError("No eligible employees found")
+
+        winner = self.participants[self.table.sample(rng)]
+        return {
+            'id': winner['id'],
+            'name': winner['name'],
+            'entries': winner['entries'],
+            'chance': round(winner['entries'] / self.total_entries * 100, 2)
+        }
+
+    def draw_many(self, count: int, rng: random.Random = None) -> List[Dict]:
+        """Pick count distinct winners, weighted and without replacement"""
+        if self.table is None:
+            raise ValueError("No eligible employees found")
+        if count > len(self.participants):
+            raise ValueError(f"Only {len(self.participants)} eligible employees for {count} prizes")
+
+        rng = rng or _rng
+        tree = FenwickTree([p['entries'] for p in self.participants])
+        winners = []
+        for _ in range(count):
+            remaining = tree.total
+            index = tree.find(rng.randrange(remaining))
+            participant = self.participants[index]
+            winners.append({
+                'id': participant['id'],
+                'name': participant['name'],
+                'entries': participant['entries'],
+                'chance': round(participant['entries'] / remaining * 100, 2)
+            })
+            # Remove the winner so they cannot be drawn again
+            tree.add(index, -participant['entries'])
+        return winners
+
+def load_participants(conn) -> List[Dict]:
+    """Fetch every active employee holding at least one entry"""
+    cursor = conn.execute('''
+        SELECT id, name, total_entries
+        FROM employees
+        WHERE is_active = 1 AND total_entries > 0
+        ORDER BY id
+    ''')
+    return [{'id': row['id'], 'name': row['name'], 'entries': row['total_entries']}
+            for row in cursor.fetchall()]
+
+class DrawEngine:
+    """Caches the alias table per data version so repeated draws skip the rebuild"""
+
+    def __init__(self, database):
+        self.database = database
+        self._lock = threading.Lock()
+        self._current: Optional[RaffleDraw] = None
+
+    def snapshot(self, conn) -> RaffleDraw:
+        """Return the draw table for the current data version, rebuilding only if stale.
+        
+        Only tables built from committed data are cached. Inside a write transaction the
+        version may come from uncommitted changes, and a rolled-back group commit can hand
+        the same version number to different data later, so that table is used once.
+        """
+        version = self.database.get_data_version(conn)
+        current = self._current
+        if current is not None and current.version == version:
+            return current
+
+        if conn.in_transaction:
+            return RaffleDraw(version, load_participants(conn))
+
+        with self._lock:
+            if self._current is None or self._current.version != version:
+                self._current = RaffleDraw(version, load_participants(conn))
+            return self._current
+
+    def draw(self, conn, rng: random.Random = None) -> Tuple[Dict, RaffleDraw]:
+        """Draw a single winner, returning it with the snapshot it came from"""
+        snapshot = self.snapshot(conn)
+        return snapshot.draw(rng), snapshot
+
+    def draw_many(self, conn, count: int, rng: random.Random = None,
+                  prepared: RaffleDraw = None) -> Tuple[List[Dict], RaffleDraw]:
+        """Draw count distinct winners, returning them with the snapshot they came from.
+        
+        prepared, a snapshot taken earlier on another connection, is used as long as conn
+        still sees its data version, so a write transaction can skip the O(n) rebuild.
+        """
+        if prepared is not None and prepared.version == self.database.get_data_version(conn):
+            snapshot = prepared
+        else:
+            snapshot = self.snapshot(conn)
+        return snapshot.draw_many(count, rng), snapshot
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from typing import Optional, Tuple
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from config import Config
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Flask-Limiter counters in a local SQLite file, so every gunicorn worker enforces the same limits"""
+
+    # Defining the class registers sqlite:///<path> with limits; fixed-window and
+    # sliding-window-counter strategies are supported
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, purge_interval: float = None,
+                 purge_batch: int = None, **options):
+        # sqlite:///relative/path or sqlite:////absolute/path, as in SQLAlchemy
+        path = (uri or '')[len('sqlite:///'):] if (uri or '').startswith('sqlite:///') else ''
+        self.path = path or os.path.join(os.path.dirname(Config.DATABASE_PATH) or '.', 'rate_limits.db')
+        self.purge_interval = float(purge_interval if purge_interval is not None else Config.RATELIMIT_PURGE_INTERVAL)
+        self.purge_batch = int(purge_batch if purge_batch is not None else Config.RATELIMIT_PURGE_BATCH)
+        self._local = threading.local()
+        self._next_purge = 0.0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._connection().execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits(expires_at)')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection, reopened after a fork since SQLite handles must not cross processes"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Counters are disposable, so skip fsyncs entirely
+            conn.execute('PRAGMA synchronous=OFF')
+            local.connection = conn
+            local.pid = os.getpid()
+        return local.connection
+
+    def _purge_expired(self, conn: sqlite3.Connection, now: float):
+        """Every purge_interval, delete up to purge_batch expired keys, so idle keys do not pile up"""
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        conn.execute('''
+            DELETE FROM rate_limits WHERE key IN (
+                SELECT key FROM rate_limits WHERE expires_at <= ? LIMIT ?
+            )
+        ''', (now, self.purge_batch))
+
+    def _incr(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        # An expired counter restarts from amount with a fresh expiry instead of carrying on
+        return conn.execute('''
+            INSERT INTO rate_limits (key, count, expires_at) VALUES (?1, ?2, ?3 + ?4)
+            ON CONFLICT(key) DO UPDATE SET
+                count = CASE WHEN expires_at <= ?3 THEN ?2 ELSE count + ?2 END,
+                expires_at = CASE WHEN expires_at <= ?3 THEN ?3 + ?4 ELSE expires_at END
+            RETURNING count
+        ''', (key, amount, now, expiry)).fetchone()[0]
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connection()
+        count = self._incr(conn, key, expiry, amount, now)
+        self._purge_expired(conn, now)
+        return count
+
+    def _row(self, conn: sqlite3.Connection, key: str, now: float) -> Optional[Tuple[int, float]]:
+        return conn.execute('SELECT count, expires_at FROM rate_limits WHERE key = ? AND expires_at > ?',
+                            (key, now)).fetchone()
+
+    def get(self, key: str) -> int:
+        row = self._row(self._connection(), key, time.time())
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._row(self._connection(), key, now)
+        return row[1] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._connection().execute('DELETE FROM rate_limits').rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def _sliding_window(self, conn: sqlite3.Connection, key: str, expiry: int,
+                        now: float) -> Tuple[str, int, float, int, float]:
+        """The current window's key, then previous count and TTL and current count and TTL"""
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(conn.execute('SELECT key, count FROM rate_limits WHERE key IN (?, ?) AND expires_at > ?',
+                                   (previous_key, current_key, now)).fetchall())
+        previous_count = counts.get(previous_key, 0)
+        current_count = counts.get(current_key, 0)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._connection()
+        # Read and increment under one write lock, so two workers cannot both take the last slot
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current_key, previous_count, previous_ttl, current_count, _ = self._sliding_window(conn, key, expiry, now)
+            acquired = floor(previous_count * previous_ttl / expiry + current_count) + amount <= limit
+            if acquired:
+                # Kept for two windows, since it is the previous window for the whole of the next one
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+            self._purge_expired(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return acquired
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._sliding_window(self._connection(), key, expiry, time.time())[1:]
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._connection().execute('DELETE FROM rate_limits WHERE key IN (?, ?)', (previous_key, current_key))
@@ -0,0 +1,283 @@
+import json
+import sqlite3
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from config import Config
+
+# The README's three tiers: category, entries per award, weight, activity names
+TIERS = [
+    ('high_impact', 3, 15, ['Perfect attendance for entire quarter', 'Referral of new Care Professional',
+                            'Covering 5+ open/last-minute shifts in quarter']),
+    ('strong_contribution', 2, 35, ['Covering 1-4 open/last-minute shifts', 'Completing required training on time',
+                                    'Going above and beyond', 'Participating in 2+ company events/meetings']),
+    ('everyday_excellence', 1, 50, ['Proper uniform and badge consistently', 'Care notes accurate and on time',
+                                    'Work anniversary celebration']),
+]
+
+# Department, share of the workforce, positions within it
+DEPARTMENTS = [
+    ('Caregiving', 70, ['Care Professional', 'CNA', 'Home Health Aide', 'Companion Caregiver']),
+    ('Client Care', 10, ['Client Care Coordinator', 'Care Manager']),
+    ('Scheduling', 8, ['Scheduler', 'Scheduling Coordinator']),
+    ('Recruiting', 5, ['Recruiter', 'Recruiting Coordinator']),
+    ('Training', 4, ['Trainer', 'Training Coordinator']),
+    ('Office', 3, ['Office Manager', 'Administrative Assistant', 'Owner']),
+]
+
+FIRST_NAMES = ['Maria', 'James', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles',
+               'Karen', 'Christopher', 'Lisa', 'Daniel', 'Nancy', 'Matthew', 'Betty', 'Anthony', 'Sandra',
+               'Mark', 'Margaret', 'Donald', 'Ashley', 'Steven', 'Kimberly', 'Paul', 'Emily', 'Andrew',
+               'Donna', 'Joshua', 'Michelle', 'Kenneth', 'Carol', 'Kevin', 'Amanda', 'Brian', 'Melissa',
+               'George', 'Deborah', 'Timothy', 'Stephanie', 'Ronald', 'Rebecca', 'Jason', 'Sharon', 'Edward',
+               'Laura', 'Jeffrey', 'Cynthia', 'Ryan', 'Dorothy', 'Jacob', 'Amy', 'Gary', 'Kathleen', 'Luis']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore',
+              'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark',
+              'Ramirez', 'Lewis', 'Robinson', 'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres',
+              'Nguyen', 'Hill', 'Flores', 'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell',
+              'Mitchell', 'Carter', 'Roberts', 'Gomez', 'Phillips', 'Evans', 'Turner', 'Diaz', 'Parker']
+
+PRIZES = ['$100 gift card', '$250 gift card', 'Extra PTO day', 'Spa package', 'Dinner for two', '$500 bonus']
+USER_AGENTS = ['Mozilla/5.0 (Windows NT 10.0; Win64; x64)', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0)',
+               'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X)']
+
+# Rows handed to each executemany call
+BATCH_SIZE = 10000
+
+class Seeder:
+    """Bulk-loads realistic synthetic data, the same rows every time for a given seed and end date"""
+
+    def __init__(self, database, seed: int = 1, end_date: str = None,
+                 progress: Optional[Callable[[str], None]] = None):
+        self.database = database
+        self.seed = seed
+        end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        # Everything happens before the end date, so it is the exclusive upper bound
+        self.end = end
+        self.end_ts = int((end - datetime(1970, 1, 1)).total_seconds())
+        self.progress = progress or (lambda message: None)
+
+    def seed_database(self, employees: int, activities: int, audit_rows: int = None, raffles: int = 8,
+                      managers: int = 5, days: int = 365, force: bool = False) -> Dict:
+        """Load everything in one transaction with triggers and indexes rebuilt once at the end"""
+        audit_rows = activities if audit_rows is None else audit_rows
+        rng = random.Random(self.seed)
+        started = time.perf_counter()
+
+        with self.database.get_connection() as conn:
+            existing = conn.execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+            if existing and not force:
+                raise ValueError(f'Database already has {existing} employees; seed an empty database '
+                                 f'or pass force')
+
+            # Settings that only make sense for a one-off load into a file we can rebuild:
+            # no fsyncs, a rollback journal instead of copying every page through the WAL,
+            # no per-row foreign key lookups and a large page cache
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('PRAGMA foreign_keys=OFF')
+            conn.execute('PRAGMA cache_size=-262144')
+            journal_mode = self._leave_wal(conn)
+
+            try:
+                conn.execute('BEGIN')
+                derived = self._drop_derived(conn)
+
+                self.progress(f'users: {managers} managers')
+                manager_ids = self._insert_managers(conn, managers)
+                self.progress(f'employees: {employees}')
+                names = self._insert_employees(conn, rng, employees, existing)
+                self.progress(f'activities: {activities}')
+                totals = self._insert_activities(conn, rng, names, activities, manager_ids, days, existing)
+                conn.executemany('UPDATE employees SET total_entries = ? WHERE id = ?',
+                                 ((total, existing + i + 1) for i, total in enumerate(totals) if total))
+                self.progress(f'raffles: {raffles}')
+                self._insert_raffles(conn, rng, totals, raffles, manager_ids, days, existing)
+                self.progress(f'audit rows: {audit_rows}')
+                self._insert_audit(conn, rng, names, audit_rows, activities, manager_ids, days)
+
+                self.progress('indexes, triggers and summary tables')
+                for sql in derived:
+                    conn.execute(sql)
+                self.database.rebuild_department_stats(conn)
+                self.database.rebuild_activity_rollups(conn)
+                conn.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'data_version'")
+                conn.commit()
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute(f'PRAGMA journal_mode={journal_mode}')
+                conn.execute('PRAGMA foreign_keys=ON')
+                for name in ('synchronous', 'cache_size', 'busy_timeout'):
+                    conn.execute(f'PRAGMA {name}={Config.SQLITE_PRAGMAS[name]}')
+
+        return {
+            'managers': managers,
+            'employees': employees,
+            'activities': activities,
+            'raffles': raffles,
+            'audit_rows': audit_rows,
+            'seconds': round(time.perf_counter() - started, 1)
+        }
+
+    def _leave_wal(self, conn) -> str:
+        """Switch to a rollback journal for the load if no other connection has the file open"""
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.execute('PRAGMA busy_timeout=0')
+        try:
+            conn.execute('PRAGMA journal_mode=DELETE')
+        except sqlite3.OperationalError:
+            self.progress('database is open elsewhere, loading through the WAL')
+        return journal_mode
+
+    @staticmethod
+    def _drop_derived(conn) -> List[str]:
+        """Drop triggers and secondary indexes so rows load without per-row upkeep; returns their SQL"""
+        rows = conn.execute('''
+            SELECT type, name, sql FROM sqlite_master
+            WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+            ORDER BY type
+        ''').fetchall()
+        for row in rows:
+            conn.execute(f"DROP {row['type'].upper()} {row['name']}")
+        # Indexes sort first, so they are rebuilt before the triggers come back
+        return [row['sql'] for row in rows]
+
+    def _timestamp(self, rng: random.Random, days: int) -> int:
+        """A random second within the last `days` days before the end date"""
+        return self.end_ts - 1 - rng.randrange(days * 86400)
+
+    def _batches(self, rows: Iterator[Tuple]) -> Iterator[List[Tuple]]:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    def _insert_managers(self, conn, count: int) -> List[int]:
+        """Office users who award entries and run raffles, all sharing one password hash"""
+        import bcrypt
+        password_hash = bcrypt.hashpw(b'seeded-password', bcrypt.gensalt(rounds=4)).decode('utf-8')
+        ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role IN ('admin', 'manager')")]
+        for n in range(1, count + 1):
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO users (email, password_hash, role, name)
+                VALUES (?, ?, 'manager', ?)
+            ''', (f'manager{n}@example.com', password_hash, f'Manager {n}'))
+            if cursor.rowcount:
+                ids.append(cursor.lastrowid)
+        return ids or [None]
+
+    def _insert_employees(self, conn, rng: random.Random, count: int, first_id: int) -> List[str]:
+        """Insert employees with explicit ids; returns their names in id order"""
+        department_weights = list(accumulate(weight for _, weight, _ in DEPARTMENTS))
+        names = []
+
+        def rows():
+            for i in range(count):
+                employee_id = first_id + i + 1
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                name = f'{first} {last}'
+                names.append(name)
+                department, _, positions = rng.choices(DEPARTMENTS, cum_weights=department_weights)[0]
+                hired = self.end - timedelta(days=rng.randrange(10 * 365))
+                created = max(hired, self.end - timedelta(days=3 * 365))
+                yield (employee_id, name, f'{first}.{last}.{employee_id}@example.com'.lower(),
+                       f'555-{rng.randrange(10000):04d}', department, rng.choice(positions),
+                       hired.strftime('%Y-%m-%d'), 1 if rng.random() < 0.95 else 0,
+                       created.strftime('%Y-%m-%d %H:%M:%S'))
+
+        for batch in self._batches(rows()):
+            conn.executemany('''
+                INSERT INTO employees (id, name, email, phone, department, position, hire_date,
+                                       is_active, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [row + (row[-1],) for row in batch])
+        return names
+
+    def _insert_activities(self, conn, rng: random.Random, names: List[str], count: int,
+                           manager_ids: List[int], days: int, first_id: int) -> List[int]:
+        """Insert activity awards, a few employees earning most of them; returns entries per employee"""
+        totals = [0] * len(names)
+        if not names:
+            return totals
+        # Pareto weights give the long tail a real roster has
+        employee_weights = list(accumulate(rng.paretovariate(1.5) for _ in names))
+        tier_weights = list(accumulate(weight for _, _, weight, _ in TIERS))
+        indexes = range(len(names))
+
+        def rows():
+            remaining = count
+            while remaining > 0:
+                chunk = min(remaining, BATCH_SIZE)
+                remaining -= chunk
+                picked = rng.choices(indexes, cum_weights=employee_weights, k=chunk)
+                tiers = rng.choices(TIERS, cum_weights=tier_weights, k=chunk)
+                for index, (category, entries, _, activity_names) in zip(picked, tiers):
+                    totals[index] += entries
+                    yield (first_id + index + 1, rng.choice(activity_names), category, entries,
+                           rng.choice(manager_ids), self._timestamp(rng, days))
+
+        for batch in self._batches(rows()):
+            conn.executemany('''
+                INSERT INTO activities (employee_id, activity_name, activity_category, entries_awarded,
+                                        awarded_by, created_at)
+                VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+            ''', batch)
+        return totals
+
+    def _insert_raffles(self, conn, rng: random.Random, totals: List[int], count: int,
+                        manager_ids: List[int], days: int, first_id: int):
+        """Past draws, winners weighted by their entries like the real draw"""
+        pool_entries = sum(totals)
+        if not pool_entries or not count:
+            return
+        weights = list(accumulate(totals))
+        participants = sum(1 for total in totals if total)
+        rows = []
+        for _ in range(count):
+            index = rng.choices(range(len(totals)), cum_weights=weights)[0]
+            rows.append((first_id + index + 1, rng.choice(PRIZES), participants, pool_entries,
+                         round(totals[index] / pool_entries * 100, 4), rng.choice(manager_ids),
+                         self._timestamp(rng, days)))
+        rows.sort(key=lambda row: row[-1])
+        conn.executemany('''
+            INSERT INTO raffle_history (winner_id, prize, total_participants, total_entries,
+                                        winning_chance, conducted_by, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+        ''', rows)
+
+    def _insert_audit(self, conn, rng: random.Random, names: List[str], count: int, activities: int,
+                      manager_ids: List[int], days: int):
+        """Audit trail in the shapes the app writes: entry awards, logins and roster changes"""
+        def rows():
+            for _ in range(count):
+                user_id = rng.choice(manager_ids)
+                ip_address = f'10.0.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+                user_agent = rng.choice(USER_AGENTS)
+                roll = rng.random()
+                if roll < 0.7 and names and activities:
+                    entries = rng.choice((1, 2, 3))
+                    action, table_name = f'Added {entries} entries for {rng.choice(names)}', 'activities'
+                    record_id, new_values = rng.randint(1, activities), json.dumps({'entries_awarded': entries})
+                elif roll < 0.9:
+                    action, table_name, record_id, new_values = 'User login', None, None, None
+                elif names:
+                    index = rng.randrange(len(names))
+                    action, table_name = f'Added employee: {names[index]}', 'employees'
+                    record_id, new_values = index + 1, json.dumps({'name': names[index]})
+                else:
+                    action, table_name, record_id, new_values = 'User logout', None, None, None
+                yield (user_id, action, table_name, record_id, new_values, ip_address, user_agent,
+                       self._timestamp(rng, days))
+
+        for batch in self._batches(rows()):
+            conn.executemany('''
+                INSERT INTO audit_log (user_id, action, table_name, record_id, new_values,
+                                       ip_address, user_agent, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+            ''', batch)
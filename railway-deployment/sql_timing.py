@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+import time
+from contextvars import ContextVar
+from typing import Optional
+from flask import request
+from config import Config
+from metrics import observe_query
+
+log = logging.getLogger('raffle.sql')
+
+# Statement kinds EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+class QueryStats:
+    """Statement count and time for one request"""
+
+    def __init__(self, label: str = None):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+
+    def add(self, elapsed: float, slow: bool = False):
+        self.count += 1
+        self.seconds += elapsed
+        if slow:
+            self.slow += 1
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats for the request running in this context, if any"""
+    return _current_stats.get()
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> str:
+    """Return the query plan as one line, without running the statement"""
+    # Batched statements have no single parameter set to plan with
+    if params is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return 'n/a'
+    try:
+        # A plain cursor, so explaining is neither timed nor explained again
+        rows = sqlite3.Cursor(conn).execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    except sqlite3.Error as e:
+        return f'unavailable ({e})'
+    return '; '.join(row[3] for row in rows)
+
+def _record(conn: sqlite3.Connection, sql: str, params, elapsed: float):
+    observe_query(sql, elapsed)
+    slow = elapsed * 1000 >= Config.SLOW_QUERY_MS
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add(elapsed, slow)
+
+    if slow:
+        log.warning('Slow query %.1fms: %s', elapsed * 1000, ' '.join(sql.split()), extra={
+            'request': stats.label if stats is not None else None,
+            'duration_ms': round(elapsed * 1000, 1),
+            'plan': explain(conn, sql, params)
+        })
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that times every statement it runs"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(self.connection, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(self.connection, sql, None, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record(self.connection, sql_script, None, time.perf_counter() - started)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors - including the ones conn.execute creates - are timed"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts bypass cursor(), so route them through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def init_sql_timing(app):
+    """Count and time each request's SQL and report it in a Server-Timing header"""
+
+    @app.before_request
+    def start_sql_timing():
+        request.sql_timing_token = _current_stats.set(QueryStats(f'{request.method} {request.path}'))
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = _current_stats.get()
+        if stats is not None:
+            response.headers.add('Server-Timing', stats.server_timing())
+        return response
+
+    @app.teardown_request
+    def end_sql_timing(exc=None):
+        token = getattr(request, 'sql_timing_token', None)
+        if token is not None:
+            _current_stats.reset(token)
@@ -25,6 +25,7 @@ class RaffleDashboard {
         
         this.bindEvents();
         this.loadEmployees();
+        this.connectEventStream();
         this.updateDateInfo();
         this.initAnimations();
         this.updateStats();
@@ -185,17 +186,23 @@ class RaffleDashboard {
         };
     }
 
-    spinWheel() {
+    async spinWheel() {
         if (this.raffleData.isSpinning) return;
-        
+
         this.raffleData.isSpinning = true;
         const spinBtn = document.getElementById('spin-wheel-btn');
         spinBtn.disabled = true;
         spinBtn.innerHTML = '<div class="loading"></div> Spinning...';
-        
-        // Select winner using weighted random selection
-        const winner = this.selectWeightedWinner();
-        
+
+        // Winner is drawn server-side from the weighted alias table
+        const winner = await this.drawWinner();
+        if (!winner) {
+            this.raffleData.isSpinning = false;
+            spinBtn.disabled = false;
+            spinBtn.innerHTML = 'Spin the Wheel!';
+            return;
+        }
+
         // Calculate spin animation
         const baseSpins = 5; // Number of full rotations
         const randomSpin = Math.random() * 360; // Random final position
@@ -215,20 +222,27 @@ class RaffleDashboard {
         this.addSpinEffects();
     }
 
-    selectWeightedWinner() {
-        const random = Math.random() * this.raffleData.totalEntries;
-        let currentWeight = 0;
-        
-        for (const employee of this.raffleData.participants) {
-            currentWeight += employee.total_entries;
-            if (random <= currentWeight) {
-                return { name: employee.name, data: { entries: employee.total_entries } };
+    async drawWinner() {
+        try {
+            const response = await fetch('/api/raffle/conduct', {
+                method: 'POST',
+                headers: this.getAuthHeaders(),
+                body: JSON.stringify({}),
+                credentials: 'same-origin'
+            });
+
+            const data = await response.json();
+
+            if (!data.success) {
+                this.showAlert(data.error || 'Failed to draw a winner', 'error');
+                return null;
             }
+
+            return { name: data.winner.name, data: { entries: data.winner.entries, chance: data.winner.chance } };
+        } catch (error) {
+            this.showAlert('Failed to draw a winner. Please try again.', 'error');
+            return null;
         }
-        
-        // Fallback (should never reach here)
-        const fallbackEmployee = this.raffleData.participants[0];
-        return { name: fallbackEmployee.name, data: { entries: fallbackEmployee.total_entries } };
     }
 
     announceWinner(winner) {
@@ -570,6 +584,58 @@ class RaffleDashboard {
         }
     }
 
+    connectEventStream() {
+        if (!window.EventSource) return;
+
+        // EventSource reconnects on its own and resumes from Last-Event-ID
+        this.eventSource = new EventSource('/api/stream', { withCredentials: true });
+        const types = ['employee_added', 'entry_awarded', 'employee_deactivated', 'entries_reset',
+                       'employees_imported', 'roster_reset', 'winner_recorded'];
+        types.forEach(type => {
+            this.eventSource.addEventListener(type, (e) => this.applyChangeEvent(type, JSON.parse(e.data)));
+        });
+
+        // A refused stream (503 while the server's stream slots are full) is not retried by
+        // EventSource itself, so try again later and reload the roster to catch up on missed changes
+        this.eventSource.onerror = () => {
+            if (this.eventSource.readyState !== EventSource.CLOSED) return;
+            setTimeout(() => {
+                this.loadEmployees();
+                this.connectEventStream();
+            }, 15000 + Math.random() * 15000);
+        };
+    }
+
+    applyChangeEvent(type, data) {
+        switch (type) {
+            case 'employee_added':
+                if (!this.employees.some(employee => employee.id === data.id)) {
+                    this.employees.push({ ...data, activities: [] });
+                    this.employees.sort((a, b) => a.name.localeCompare(b.name));
+                }
+                break;
+            case 'entry_awarded':
+            case 'entries_reset': {
+                const employee = this.employees.find(employee => employee.id === data.employee_id);
+                if (employee) employee.total_entries = data.total_entries;
+                break;
+            }
+            case 'employee_deactivated':
+                this.employees = this.employees.filter(employee => employee.id !== data.employee_id);
+                break;
+            case 'employees_imported':
+            case 'roster_reset':
+                // Bulk changes are cheaper to refetch than to describe
+                this.loadEmployees();
+                return;
+            case 'winner_recorded':
+                return;
+        }
+
+        this.renderEmployees();
+        this.updateStatsSmooth();
+    }
+
     async loadEmployees() {
         try {
             const response = await fetch('/api/employees', {
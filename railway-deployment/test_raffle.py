@@ -0,0 +1,95 @@
+import random
+from collections import Counter
+import pytest
+from raffle import AliasTable, FenwickTree, RaffleDraw
+
+# Chi-squared critical value at p = 0.001 for 4 degrees of freedom (five weighted participants).
+# The draws are seeded, so these tests are deterministic; the bound only guards against a
+# sampler whose picks do not follow the weights at all
+CHI2_CRITICAL_DF4 = 18.47
+WEIGHTS = [1, 2, 3, 4, 10]
+TRIALS = 20000
+
+def make_participants(weights):
+    return [{'id': i + 1, 'name': f'Employee {i + 1}', 'entries': w} for i, w in enumerate(weights)]
+
+def chi_squared(counts, weights, trials):
+    total = sum(weights)
+    return sum((counts[i] - trials * w / total) ** 2 / (trials * w / total)
+               for i, w in enumerate(weights))
+
+def test_alias_table_tracks_weights():
+    table = AliasTable(WEIGHTS)
+    rng = random.Random(1234)
+    counts = Counter(table.sample(rng) for _ in range(TRIALS))
+    assert chi_squared(counts, WEIGHTS, TRIALS) < CHI2_CRITICAL_DF4
+
+def test_alias_table_rejects_empty_and_zero_weights():
+    with pytest.raises(ValueError):
+        AliasTable([])
+    with pytest.raises(ValueError):
+        AliasTable([0, 0])
+
+def test_alias_table_never_picks_zero_weight():
+    table = AliasTable([0, 5, 0, 1, 0])
+    rng = random.Random(7)
+    picks = {table.sample(rng) for _ in range(5000)}
+    assert picks == {1, 3}
+
+def test_fenwick_find_matches_cumulative_ranges():
+    weights = [3, 0, 1, 4, 0, 0, 2, 5]
+    tree = FenwickTree(weights)
+    expected = [i for i, w in enumerate(weights) for _ in range(w)]
+    assert tree.total == sum(weights)
+    assert [tree.find(t) for t in range(tree.total)] == expected
+
+def test_fenwick_add_updates_search():
+    weights = [3, 1, 4, 2]
+    tree = FenwickTree(weights)
+    tree.add(2, -4)
+    weights[2] = 0
+    expected = [i for i, w in enumerate(weights) for _ in range(w)]
+    assert tree.total == 6
+    assert [tree.find(t) for t in range(tree.total)] == expected
+
+def test_draw_tracks_weights():
+    snapshot = RaffleDraw(1, make_participants(WEIGHTS))
+    rng = random.Random(42)
+    counts = Counter(snapshot.draw(rng)['id'] - 1 for _ in range(TRIALS))
+    assert chi_squared(counts, WEIGHTS, TRIALS) < CHI2_CRITICAL_DF4
+
+def test_draw_many_returns_distinct_winners():
+    snapshot = RaffleDraw(1, make_participants([5, 1, 3, 8, 2, 1, 4]))
+    rng = random.Random(99)
+    for count in range(1, len(snapshot.participants) + 1):
+        winners = snapshot.draw_many(count, rng)
+        assert len(winners) == count
+        assert len({w['id'] for w in winners}) == count
+
+def test_draw_many_never_picks_zero_entries():
+    participants = make_participants([0, 3, 0, 2, 5, 0])
+    snapshot = RaffleDraw(1, participants)
+    zero_ids = {p['id'] for p in participants if p['entries'] == 0}
+    rng = random.Random(5)
+    for _ in range(2000):
+        winners = snapshot.draw_many(3, rng)
+        assert not zero_ids & {w['id'] for w in winners}
+    assert not zero_ids & {snapshot.draw(rng)['id'] for _ in range(2000)}
+
+def test_draw_many_first_pick_tracks_weights():
+    snapshot = RaffleDraw(1, make_participants(WEIGHTS))
+    rng = random.Random(2024)
+    counts = Counter(snapshot.draw_many(2, rng)[0]['id'] - 1 for _ in range(TRIALS))
+    assert chi_squared(counts, WEIGHTS, TRIALS) < CHI2_CRITICAL_DF4
+
+def test_draw_many_rejects_more_prizes_than_participants():
+    snapshot = RaffleDraw(1, make_participants([1, 2, 3]))
+    with pytest.raises(ValueError):
+        snapshot.draw_many(4, random.Random(0))
+
+def test_draw_without_participants_raises():
+    snapshot = RaffleDraw(1, [])
+    with pytest.raises(ValueError):
+        snapshot.draw(random.Random(0))
+    with pytest.raises(ValueError):
+        snapshot.draw_many(1, random.Random(0))
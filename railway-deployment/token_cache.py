@@ -0,0 +1,62 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import Config
+
+class TokenCache:
+    """Bounded LRU of recently verified JWTs, so repeat requests skip the decode and signature check"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else Config.TOKEN_CACHE_SIZE
+        self._entries = OrderedDict()  # token hash -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Only a digest is kept, so the cache never holds a usable token
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        """The claims a token verified to, or None if it is not cached or has reached its exp"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: Dict, exp: float):
+        """Remember a verified token's claims until its exp, evicting the least recently used"""
+        if self.max_entries <= 0 or exp <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(claims), exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Size and hit rate for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,246 @@
+import contextvars
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+from config import Config
+from metrics import DB_BUSY_FAILURES, DB_BUSY_RETRIES
+from sql_timing import TimedConnection
+
+class WriteJob:
+    """A queued write: the function to run in a transaction and the future its caller waits on"""
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        # Run in the caller's context so its statements count towards the caller's request
+        self.context = contextvars.copy_context()
+
+class JobAborted(Exception):
+    """A job's failure took the whole transaction down with it, not just its savepoint"""
+
+    def __init__(self, job: WriteJob, error: BaseException):
+        super().__init__(str(error))
+        self.job = job
+        self.error = error
+
+class WriteQueue:
+    """Runs every write in this process on one connection, committing queued writes in groups"""
+
+    def __init__(self, db_path: str, busy_timeout: int = None, max_retries: int = None,
+                 backoff_base: float = None, backoff_max: float = None, pragmas: Dict = None,
+                 group_commit: bool = None, group_window: float = None, group_max: int = None):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout if busy_timeout is not None else Config.WRITE_BUSY_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else Config.WRITE_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else Config.WRITE_BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else Config.WRITE_BACKOFF_MAX
+        self.pragmas = pragmas if pragmas is not None else Config.SQLITE_PRAGMAS
+        self.group_commit = group_commit if group_commit is not None else Config.WRITE_GROUP_COMMIT
+        self.group_window = group_window if group_window is not None else Config.WRITE_GROUP_WINDOW
+        self.group_max = group_max or Config.WRITE_GROUP_MAX
+
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._thread_ident = None
+        self._pid = None
+        self._connection = None
+        self._last_group_size = 1
+        self._counters = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'busy_retries': 0,
+            'busy_failures': 0,
+            'groups': 0,
+            'max_group_size': 0,
+            'max_queue_depth': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'exec_seconds': 0.0
+        }
+
+    def _ensure_started(self):
+        """Start the writer thread lazily so it is created in the worker, not the gunicorn master"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._connection = None
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """The writer's own connection, in autocommit mode so transactions are explicit"""
+        if self._connection is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout / 1000.0,
+                                   isolation_level=None, check_same_thread=False, factory=TimedConnection)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            for name, value in self.pragmas.items():
+                conn.execute(f'PRAGMA {name}={value}')
+            # A short busy timeout hands lock waits to our own backoff, where they are counted
+            conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+            self._connection = conn
+        return self._connection
+
+    def in_writer(self) -> bool:
+        """True when called from the writer thread itself"""
+        return threading.get_ident() == self._thread_ident and self._pid == os.getpid()
+
+    def execute(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(conn, *args, **kwargs) in a write transaction and return its result"""
+        if self.in_writer():
+            # A write issued from inside a running job joins that job's transaction
+            return fn(self._connection, *args, **kwargs)
+
+        self._ensure_started()
+        job = WriteJob(fn, args, kwargs)
+        self._queue.put(job)
+        with self._stats_lock:
+            self._counters['submitted'] += 1
+            self._counters['max_queue_depth'] = max(self._counters['max_queue_depth'], self._queue.qsize())
+        return job.future.result()
+
+    def _run(self):
+        self._thread_ident = threading.get_ident()
+        while True:
+            jobs = self._collect(self._queue.get())
+            self._execute(jobs)
+
+    def _collect(self, first: WriteJob) -> List[WriteJob]:
+        """Gather the jobs arriving within the group window so they share one commit"""
+        jobs = [first]
+        if not self.group_commit:
+            return jobs
+
+        # Only wait for as many writers as were active last time; a lone writer never waits
+        expected = min(self._last_group_size, self.group_max)
+        deadline = time.monotonic() + self.group_window
+        while len(jobs) < self.group_max:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and len(jobs) < expected:
+                    jobs.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the window, still take whatever is already queued
+                    jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._last_group_size = len(jobs)
+        return jobs
+
+    @staticmethod
+    def _is_busy(error: sqlite3.OperationalError) -> bool:
+        message = str(error).lower()
+        return 'locked' in message or 'busy' in message
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter so workers retrying together spread out"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _rollback(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def _run_job(self, conn: sqlite3.Connection, job: WriteJob) -> Tuple[Any, BaseException]:
+        """Run one job in its own savepoint so its failure undoes only its own changes"""
+        conn.execute('SAVEPOINT job')
+        try:
+            result = job.context.run(job.fn, conn, *job.args, **job.kwargs)
+        except BaseException as e:
+            if not conn.in_transaction:
+                # SQLite already rolled back everything (e.g. disk full), so the group must rerun
+                raise JobAborted(job, e)
+            conn.execute('ROLLBACK TO job')
+            conn.execute('RELEASE job')
+            return None, e
+        conn.execute('RELEASE job')
+        return result, None
+
+    def _execute(self, jobs: List[WriteJob]):
+        """Run a group of jobs under one BEGIN IMMEDIATE and one COMMIT, retrying while busy"""
+        started = time.monotonic()
+        attempt = 0
+
+        while jobs:
+            conn = self._get_connection()
+            try:
+                # Take the write lock up front so a busy database fails fast here, not mid-job
+                conn.execute('BEGIN IMMEDIATE')
+                outcomes = [self._run_job(conn, job) for job in jobs]
+                conn.execute('COMMIT')
+            except JobAborted as e:
+                self._rollback(conn)
+                self._finish(e.job, started, error=e.error)
+                jobs = [job for job in jobs if job is not e.job]
+                continue
+            except sqlite3.OperationalError as e:
+                self._rollback(conn)
+                if self._is_busy(e) and attempt < self.max_retries:
+                    attempt += 1
+                    with self._stats_lock:
+                        self._counters['busy_retries'] += 1
+                    DB_BUSY_RETRIES.inc()
+                    time.sleep(self._backoff(attempt))
+                    continue
+                for job in jobs:
+                    self._finish(job, started, error=e, busy=self._is_busy(e))
+                return
+            except BaseException as e:
+                self._rollback(conn)
+                for job in jobs:
+                    self._finish(job, started, error=e)
+                return
+
+            with self._stats_lock:
+                self._counters['groups'] += 1
+                self._counters['max_group_size'] = max(self._counters['max_group_size'], len(jobs))
+            for job, (result, error) in zip(jobs, outcomes):
+                self._finish(job, started, result=result, error=error)
+            return
+
+    def _finish(self, job: WriteJob, started: float, result: Any = None,
+                error: BaseException = None, busy: bool = False):
+        waited = started - job.enqueued_at
+        with self._stats_lock:
+            self._counters['wait_seconds'] += waited
+            self._counters['max_wait_seconds'] = max(self._counters['max_wait_seconds'], waited)
+            self._counters['exec_seconds'] += time.monotonic() - started
+            if error is None:
+                self._counters['committed'] += 1
+            else:
+                self._counters['failed'] += 1
+                if busy:
+                    self._counters['busy_failures'] += 1
+                    DB_BUSY_FAILURES.inc()
+
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def stats(self) -> Dict:
+        """Queue depth plus lifetime counters for this process"""
+        with self._stats_lock:
+            stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize()
+        for key in ('wait_seconds', 'max_wait_seconds', 'exec_seconds'):
+            stats[key] = round(stats[key], 4)
+        return stats